@@ -1,18 +1,26 @@
-import os, shutil, struct, zlib
+import os, queue, shutil, struct, threading, zlib
 
-def _enable_windows_vt_mode():
-    """Enable ANSI escape processing on Windows terminals that need it."""
-    if os.name != "nt":
-        return
-    try:
-        import ctypes
-        kernel32 = ctypes.windll.kernel32
-        h = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
-        mode = ctypes.c_uint()
-        if kernel32.GetConsoleMode(h, ctypes.byref(mode)):
-            kernel32.SetConsoleMode(h, mode.value | 0x0004)  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
-    except Exception:
-        pass
+from utils import data, terminal
+from utils.rendercache import DiskCache, LRUCache
+
+try:
+    import numpy as np
+except ImportError:  # optional: everything below has a pure-Python path
+    np = None
+
+_backend = "numpy" if np is not None else "python"
+
+def set_backend(name: str):
+    """Select "numpy" or "python" for unfiltering and pixel conversion."""
+    global _backend
+    if name not in ("numpy", "python"):
+        raise ValueError(f"unknown image backend: {name}")
+    if name == "numpy" and np is None:
+        raise RuntimeError("numpy backend requested but numpy is not installed")
+    _backend = name
+
+def get_backend() -> str:
+    return _backend
 
 def _path(a, b, c):
     p = a + b - c
@@ -26,67 +34,201 @@ def _path(a, b, c):
     return c
 
 def _unfilter(raw: bytes, width: int, height: int, bpp: int) -> bytearray:
+    """Unfilter a whole decompressed image (filter byte + scanline per row) with _unfilter_row."""
     stride = width * bpp
     out = bytearray(height * stride)
 
+    prev = None
     i = 0
     for y in range(height):
-        ftype = raw[i]
-        i += 1
-        row = raw[i:i + stride]
-        i += stride
-        row_out = memoryview(out)[y * stride:(y + 1) * stride]
+        prev = _unfilter_row(raw[i], raw[i + 1:i + 1 + stride], prev, bpp)
+        out[y * stride:(y + 1) * stride] = prev
+        i += 1 + stride
 
-        if ftype == 0:  # None
-            row_out[:] = row
+    return out
 
-        elif ftype == 1:  # Sub
-            for x in range(stride):
-                left = row_out[x - bpp] if x >= bpp else 0
-                row_out[x] = (row[x] + left) & 0xFF
+def _unfilter_row(ftype: int, row, prev, bpp: int) -> bytearray:
+    """Undo the filter on one scanline. `prev` is the unfiltered row above, or None for the first row."""
+    if _backend == "numpy" and ftype:
+        return _unfilter_row_numpy(ftype, row, prev, bpp)
+    return _unfilter_row_python(ftype, row, prev, bpp)
 
-        elif ftype == 2:  # Up
-            prev = memoryview(out)[(y - 1) * stride:y * stride] if y > 0 else None
-            for x in range(stride):
-                up = prev[x] if prev is not None else 0
-                row_out[x] = (row[x] + up) & 0xFF
+def _unfilter_row_python(ftype: int, row, prev, bpp: int) -> bytearray:
+    out = bytearray(row)
+    stride = len(out)
 
-        elif ftype == 3:  # Average
-            prev = memoryview(out)[(y - 1) * stride:y * stride] if y > 0 else None
-            for x in range(stride):
-                left = row_out[x - bpp] if x >= bpp else 0
-                up = prev[x] if prev is not None else 0
-                row_out[x] = (row[x] + ((left + up) >> 1)) & 0xFF
+    if ftype == 0:  # None
+        pass
 
-        elif ftype == 4:  # Paeth
-            prev = memoryview(out)[(y - 1) * stride:y * stride] if y > 0 else None
+    elif ftype == 1:  # Sub
+        for x in range(bpp, stride):
+            out[x] = (out[x] + out[x - bpp]) & 0xFF
+
+    elif ftype == 2:  # Up
+        if prev is not None:
             for x in range(stride):
-                left = row_out[x - bpp] if x >= bpp else 0
-                up = prev[x] if prev is not None else 0
-                up_left = prev[x - bpp] if (prev is not None and x >= bpp) else 0
-                row_out[x] = (row[x] + _path(left, up, up_left)) & 0xFF
-        else:
-            raise ValueError(f"Unsupported PNG filter type: {ftype}")
+                out[x] = (out[x] + prev[x]) & 0xFF
+
+    elif ftype == 3:  # Average
+        for x in range(stride):
+            left = out[x - bpp] if x >= bpp else 0
+            up = prev[x] if prev is not None else 0
+            out[x] = (out[x] + ((left + up) >> 1)) & 0xFF
+
+    elif ftype == 4:  # Paeth
+        for x in range(stride):
+            left = out[x - bpp] if x >= bpp else 0
+            up = prev[x] if prev is not None else 0
+            up_left = prev[x - bpp] if (prev is not None and x >= bpp) else 0
+            out[x] = (out[x] + _path(left, up, up_left)) & 0xFF
+    else:
+        raise ValueError(f"Unsupported PNG filter type: {ftype}")
 
     return out
 
-def _read_png_8bit_noninterlaced(path: str):
-    with open(path, "rb") as f:
-        if f.read(8) != b"\x89PNG\r\n\x1a\n":
-            raise ValueError("Not a PNG file")
+def _unfilter_row_numpy(ftype: int, row, prev, bpp: int) -> bytearray:
+    """
+    NumPy unfilter of one scanline. Sub is a cumulative sum per channel
+    (uint8 wraps like the PNG arithmetic) and Up is one addition. Average
+    and Paeth depend on the pixel to their left, so they scan each
+    channel's strided column in Python, with the row above taken as whole
+    lists instead of being indexed byte by byte.
+    """
+    a = np.frombuffer(bytes(row), dtype=np.uint8)
+    if ftype == 1:  # Sub
+        return bytearray(np.cumsum(a.reshape(-1, bpp), axis=0, dtype=np.uint8).tobytes())
+    up_row = np.frombuffer(bytes(prev), dtype=np.uint8) if prev is not None else np.zeros_like(a)
+    if ftype == 2:  # Up
+        return bytearray((a + up_row).tobytes())
+
+    out = np.empty_like(a)
+    if ftype == 3:  # Average
+        for c in range(bpp):
+            left = 0
+            vals = []
+            for r, up in zip(a[c::bpp].tolist(), up_row[c::bpp].tolist()):
+                left = (r + ((left + up) >> 1)) & 0xFF
+                vals.append(left)
+            out[c::bpp] = vals
+    elif ftype == 4:  # Paeth
+        for c in range(bpp):
+            ups = up_row[c::bpp].tolist()
+            up_lefts = [0] + ups[:-1]
+            left = 0
+            vals = []
+            for r, b, cc in zip(a[c::bpp].tolist(), ups, up_lefts):
+                pa = abs(b - cc)
+                pb = abs(left - cc)
+                pc = abs(left + b - 2 * cc)
+                if pa <= pb and pa <= pc:
+                    pred = left
+                elif pb <= pc:
+                    pred = b
+                else:
+                    pred = cc
+                left = (r + pred) & 0xFF
+                vals.append(left)
+            out[c::bpp] = vals
+    else:
+        raise ValueError(f"Unsupported PNG filter type: {ftype}")
+    return bytearray(out.tobytes())
+
+def _gray_plane(pix, w: int, h: int, ctype: int, bg_l: int):
+    """
+    One luminance byte per pixel, alpha composited over a background of
+    luminance bg_l. Whole-array arithmetic with numpy, a flat loop otherwise.
+    """
+    bpp = {0: 1, 2: 3, 4: 2, 6: 4}[ctype]
+    n = w * h
+    if _backend == "numpy":
+        a = np.frombuffer(bytes(pix), dtype=np.uint8, count=n * bpp).reshape(n, bpp).astype(np.uint32)
+        if ctype in (0, 4):
+            lum = a[:, 0]
+        else:
+            lum = (a[:, 0] * 299 + a[:, 1] * 587 + a[:, 2] * 114) // 1000
+        if ctype in (4, 6):
+            alpha = a[:, bpp - 1]
+            lum = (lum * alpha + bg_l * (255 - alpha)) // 255
+        return bytearray(lum.astype(np.uint8).tobytes())
+
+    if ctype == 0:
+        return bytearray(pix[:n])
+    out = bytearray(n)
+    if ctype == 2:
+        for i in range(n):
+            j = i * 3
+            out[i] = (pix[j] * 299 + pix[j + 1] * 587 + pix[j + 2] * 114) // 1000
+    elif ctype == 4:
+        for i in range(n):
+            g, alpha = pix[2 * i], pix[2 * i + 1]
+            out[i] = (g * alpha + bg_l * (255 - alpha)) // 255
+    elif ctype == 6:
+        for i in range(n):
+            j = i * 4
+            lum = (pix[j] * 299 + pix[j + 1] * 587 + pix[j + 2] * 114) // 1000
+            alpha = pix[j + 3]
+            out[i] = (lum * alpha + bg_l * (255 - alpha)) // 255
+    return out
+
+_INFLATE_STEP = 16 * 1024  # most decompressed bytes held at once
+_MAX_PENDING_ROWS = 16      # filtered rows sampled_rows() holds back before unfiltering them
+_PIPELINE_DEPTH = 8          # inflated pieces queued between the inflater thread and the reader
+_PIPELINE_MIN_BYTES = 1 << 20  # images with less pixel data than this are inflated inline
+_END = object()
+
+class _PngStream:
+    """
+    Row-at-a-time PNG reader.
+
+    Opening reads the chunks up to the first IDAT and validates the header.
+    rows() then feeds IDAT chunks to a zlib.decompressobj as they are read
+    and yields each scanline unfiltered, keeping only the row above it, so
+    memory stays proportional to the width rather than the whole image.
+    Large images are inflated on a second thread (see _inflate_pipelined).
 
-        width = height = None
-        bit_depth = color_type = interlace = None
-        idat = []
+    Supports:
+      - PNG bit depth 8
+      - non-interlaced
+      - color types 0,2,4,6
+    """
 
+    def __init__(self, path: str, pipelined: bool | None = None):
+        self.pipelined = pipelined  # None: pipeline images of _PIPELINE_MIN_BYTES or more
+        self._f = open(path, "rb")
+        try:
+            self._read_header()
+        except BaseException:
+            self._f.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._f.close()
+
+    def _chunk(self):
+        length_b = self._f.read(4)
+        if len(length_b) < 4:
+            return None, b""
+        (length,) = struct.unpack(">I", length_b)
+        ctype = self._f.read(4)
+        data = self._f.read(length)
+        self._f.read(4)  # CRC ignored
+        return ctype, data
+
+    def _read_header(self):
+        if self._f.read(8) != b"\x89PNG\r\n\x1a\n":
+            raise ValueError("Not a PNG file")
+
+        self.width = None
         while True:
-            length_b = f.read(4)
-            if not length_b:
-                break
-            (length,) = struct.unpack(">I", length_b)
-            ctype = f.read(4)
-            data = f.read(length)
-            f.read(4)  # CRC ignored
+            ctype, data = self._chunk()
+            if ctype is None or ctype == b"IEND":
+                raise ValueError("Corrupt PNG (missing IHDR or IDAT)")
 
             if ctype == b"IHDR":
                 width, height, bit_depth, color_type, comp, filt, interlace = struct.unpack(">IIBBBBB", data)
@@ -98,39 +240,207 @@ def _read_png_8bit_noninterlaced(path: str):
                     raise ValueError("Unsupported PNG: only 8-bit depth is handled")
                 if color_type not in (0, 2, 4, 6):
                     raise ValueError("Unsupported PNG: indexed-color (palette) PNGs (type 3) not handled")
+                self.width, self.height, self.color_type = width, height, color_type
+                self.bpp = {0: 1, 2: 3, 4: 2, 6: 4}[color_type]
 
             elif ctype == b"IDAT":
-                idat.append(data)
-
-            elif ctype == b"IEND":
-                break
-
-        if width is None or not idat:
-            raise ValueError("Corrupt PNG (missing IHDR or IDAT)")
-
-        bpp = {0: 1, 2: 3, 4: 2, 6: 4}[color_type]
-        raw = zlib.decompress(b"".join(idat))
-
-        expected = height * (1 + width * bpp)
-        if len(raw) != expected:
+                if self.width is None:
+                    raise ValueError("Corrupt PNG (missing IHDR or IDAT)")
+                self._idat = data
+                return
+
+    def _inflate(self):
+        """Decompressed image data, in pieces of at most _INFLATE_STEP bytes."""
+        d = zlib.decompressobj()
+        data = self._idat
+        self._idat = None
+        while data is not None:
+            while True:
+                out = d.decompress(data, _INFLATE_STEP)
+                data = d.unconsumed_tail
+                if out:
+                    yield out
+                if not data and len(out) < _INFLATE_STEP:
+                    break
+            ctype, data = self._chunk()
+            if ctype != b"IDAT":
+                data = None  # IDAT chunks are consecutive; the image data ends at the first other chunk
+        out = d.flush()
+        if out:
+            yield out
+
+    def _inflate_pipelined(self):
+        """
+        _inflate() run on a separate thread, handing pieces over through a
+        bounded queue. zlib releases the GIL while it inflates, so reading and
+        inflating overlap with the unfiltering done by the consumer.
+        """
+        pieces = queue.Queue(maxsize=_PIPELINE_DEPTH)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pieces.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for piece in self._inflate():
+                    if not put(piece):
+                        return
+                put(_END)
+            except BaseException as e:
+                put(e)
+
+        worker = threading.Thread(target=produce, name="png-inflate", daemon=True)
+        worker.start()
+        try:
+            while True:
+                piece = pieces.get()
+                if piece is _END:
+                    return
+                if isinstance(piece, BaseException):
+                    raise piece
+                yield piece
+        finally:
+            stop.set()
+            worker.join()
+
+    def raw_rows(self):
+        """Yield (filter type, filtered scanline) for each row, still filtered."""
+        rowlen = 1 + self.width * self.bpp
+        expected = self.height * rowlen
+        buf = bytearray()
+        got = 0
+        y = 0
+        pipelined = self.pipelined
+        if pipelined is None:
+            pipelined = expected >= _PIPELINE_MIN_BYTES
+        pieces = self._inflate_pipelined() if pipelined else self._inflate()
+        try:
+            for piece in pieces:
+                got += len(piece)
+                if y == self.height:
+                    continue  # only counting trailing data now
+                buf += piece
+                while len(buf) >= rowlen and y < self.height:
+                    yield buf[0], bytes(buf[1:rowlen])
+                    del buf[:rowlen]
+                    y += 1
+        finally:
+            pieces.close()  # stops the inflater thread when the consumer quits early
+
+        if got != expected:
             raise ValueError(
-                f"Unexpected decompressed size (got {len(raw)}, expected {expected}). "
+                f"Unexpected decompressed size (got {got}, expected {expected}). "
                 "This decoder only supports common non-interlaced 8-bit PNGs."
             )
 
-        pixels = _unfilter(raw, width, height, bpp)
-        return width, height, color_type, pixels
+    def rows(self):
+        """Yield each row's unfiltered pixel bytes, top to bottom."""
+        prev = None
+        for ftype, row in self.raw_rows():
+            prev = _unfilter_row(ftype, row, prev, self.bpp)
+            yield prev
+
+    def sampled_rows(self, wanted):
+        """
+        Yield (y, unfiltered row) for each row index in `wanted`, in order.
+
+        Rows in between are unfiltered only if a later wanted row depends on
+        them: a row filtered with None or Sub doesn't look at the row above,
+        so the filtered rows held back before it are dropped unprocessed.
+        At most _MAX_PENDING_ROWS are held back; reading stops after the
+        last wanted row.
+        """
+        wanted = set(wanted)
+        if not wanted:
+            return
+        last = max(wanted)
+        bpp = self.bpp
+        prev = None   # unfiltered row above, when it has been computed
+        pending = []  # filtered rows above that haven't been unfiltered yet
+        for y, (ftype, row) in enumerate(self.raw_rows()):
+            if ftype in (0, 1):
+                pending.clear()
+                prev = None
+            if y in wanted or len(pending) >= _MAX_PENDING_ROWS:
+                for p_ftype, p_row in pending:
+                    prev = _unfilter_row(p_ftype, p_row, prev, bpp)
+                pending.clear()
+                prev = _unfilter_row(ftype, row, prev, bpp)
+                if y in wanted:
+                    yield y, prev
+                    if y == last:
+                        return
+            else:
+                pending.append((ftype, row))
 
-def _nearest_resize(width, height, src, bpp, new_w, new_h):
-    out = bytearray(new_w * new_h * bpp)
+def _read_png_8bit_noninterlaced(path: str):
+    with _PngStream(path) as png:
+        stride = png.width * png.bpp
+        pixels = bytearray(png.height * stride)
+        for y, row in enumerate(png.rows()):
+            pixels[y * stride:(y + 1) * stride] = row
+        return png.width, png.height, png.color_type, pixels
+
+def _nearest_rows(height, new_h):
+    """Source row sampled for each output row."""
+    return [(y2 * height) // new_h for y2 in range(new_h)]
+
+def _nearest_resize_rows(rows, width, height, bpp, new_w, new_h):
+    """
+    Nearest-neighbour resize of a stream of (y, row) pairs; yields the new_h
+    output rows. Only the rows listed by _nearest_rows() need to be in the
+    stream. Columns are picked through a byte index table built once.
+    """
+    index = [(x2 * width) // new_w * bpp + c for x2 in range(new_w) for c in range(bpp)]
+    ys = _nearest_rows(height, new_h)
+    i = 0
+    for y, row in rows:
+        if i == new_h:
+            break
+        if ys[i] != y:
+            continue
+        out = bytearray(map(row.__getitem__, index))
+        while i < new_h and ys[i] == y:
+            yield out
+            i += 1
+
+def _box_resize_rows(rows, width, height, bpp, new_w, new_h):
+    """
+    Area-average resize of a stream of (y, row) pairs covering every source
+    row: each output pixel is the mean of the block of source pixels it
+    covers, per channel.
+    """
+    spans = []
+    for x2 in range(new_w):
+        x0 = (x2 * width) // new_w
+        x1 = max(x0 + 1, ((x2 + 1) * width) // new_w)
+        spans.extend((x0 * bpp + c, x1 * bpp, x1 - x0) for c in range(bpp))
+
+    rows = iter(rows)
+    cur_y, cur = -1, None
     for y2 in range(new_h):
-        y = (y2 * height) // new_h
-        for x2 in range(new_w):
-            x = (x2 * width) // new_w
-            si = (y * width + x) * bpp
-            di = (y2 * new_w + x2) * bpp
-            out[di:di + bpp] = src[si:si + bpp]
-    return out
+        y0 = (y2 * height) // new_h
+        y1 = max(y0 + 1, ((y2 + 1) * height) // new_h)
+        acc = [0] * len(spans)
+        for y in range(y0, y1):
+            while cur_y < y:
+                cur_y, cur = next(rows)
+            for i, (start, stop, _n) in enumerate(spans):
+                acc[i] += sum(cur[start:stop:bpp])
+        band = y1 - y0
+        yield bytearray(total // (band * n) for total, (_start, _stop, n) in zip(acc, spans))
+
+def _nearest_resize(width, height, src, bpp, new_w, new_h):
+    stride = width * bpp
+    rows = ((y, src[y * stride:(y + 1) * stride]) for y in range(height))
+    return bytearray(b"".join(_nearest_resize_rows(rows, width, height, bpp, new_w, new_h)))
 
 def _gray_to_ansi256(g: int) -> int:
     """
@@ -144,72 +454,395 @@ def _gray_to_ansi256(g: int) -> int:
     level = (g * 23) // 255  # 0..23
     return 232 + level
 
-def display_png_grayscale_ansi256(path: str, max_width: int | None = None, bg=(0, 0, 0)):
-    """
-    Render PNG to terminal using ANSI 256-color grayscale.
+# Lookup tables for the renderer: luminance -> ANSI 256 code (for bytes.translate),
+# and the escape strings for each code, built once instead of per cell.
+_GRAY_CODES = bytes(_gray_to_ansi256(g) for g in range(256))
+_FG = tuple(f"\x1b[38;5;{c}m" for c in range(256))
+_BG = tuple(f"\x1b[48;5;{c}m" for c in range(256))
+_FG_BG = {}  # (fg << 24) | bg -> both escapes, filled in as pairs are seen
+_MAX_PAIRS = 65536
 
-    Supports:
-      - PNG bit depth 8
-      - non-interlaced
-      - color types 0,2,4,6
+class _TrueColorEscapes(dict):
+    """Escape string per packed 0xRRGGBB colour, formatted on first use."""
 
-    Uses '▀' where FG is top pixel and BG is bottom pixel.
+    def __init__(self, fmt: str):
+        super().__init__()
+        self.fmt = fmt
+
+    def __missing__(self, rgb):
+        if len(self) >= _MAX_PAIRS:
+            self.clear()
+        esc = self[rgb] = self.fmt.format(rgb >> 16, (rgb >> 8) & 0xFF, rgb & 0xFF)
+        return esc
+
+_FG24 = _TrueColorEscapes("\x1b[38;2;{};{};{}m")
+_BG24 = _TrueColorEscapes("\x1b[48;2;{};{};{}m")
+_FG_BG24 = {}
+
+def _halfblock_line(top, bottom, fg_esc=_FG, bg_esc=_BG, pairs=_FG_BG) -> str:
+    """
+    One terminal line of '▀' cells from two rows of colour codes (FG is the
+    top pixel, BG the bottom one); fg_esc/bg_esc map a code to its escape.
+    An escape is written only when a colour differs from the cell before,
+    and runs of identical cells are joined into one string.
+    """
+    if len(pairs) > _MAX_PAIRS:
+        pairs.clear()
+    parts = []
+    fg = bg = -1
+    run = 0
+    for t, b in zip(top, bottom):
+        if t == fg and b == bg:
+            run += 1
+            continue
+        if run:
+            parts.append("▀" * run)
+        run = 1
+        if t != fg and b != bg:
+            key = (t << 24) | b
+            esc = pairs.get(key)
+            if esc is None:
+                esc = pairs[key] = fg_esc[t] + bg_esc[b]
+            parts.append(esc)
+        elif t != fg:
+            parts.append(fg_esc[t])
+        else:
+            parts.append(bg_esc[b])
+        fg, bg = t, b
+    if run:
+        parts.append("▀" * run)
+    parts.append("\x1b[0m")
+    return "".join(parts)
+
+# -- colour -------------------------------------------------------------------
+_COLOR_MODES = ("gray", "256", "truecolor")
+_CUBE_LEVELS = (0, 95, 135, 175, 215, 255)
+_LUT_BITS = 5  # colours are looked up at 5 bits per channel: a 32x32x32 table
+_color_lut = None
+
+def detect_color_mode(environ=None) -> str:
+    """
+    Best colour mode the terminal advertises: "truecolor", else "256".
+    TBOS_COLOR (gray, 256 or truecolor) overrides the detection.
+    """
+    env = os.environ if environ is None else environ
+    forced = env.get("TBOS_COLOR", "").lower()
+    if forced in _COLOR_MODES:
+        return forced
+    if env.get("COLORTERM", "").lower() in ("truecolor", "24bit") or env.get("WT_SESSION"):
+        return "truecolor"
+    return "256"
+
+def _build_color_lut() -> bytes:
     """
-    _enable_windows_vt_mode()
+    Nearest xterm-256 code for every 5-bit-per-channel colour. The 6x6x6
+    cube is separable, so each channel's nearest level and squared error
+    come from 32-entry tables; the gray ramp (232..255) is the one other
+    candidate checked per cell.
+    """
+    size = 1 << _LUT_BITS
+    values = [(i * 255) // (size - 1) for i in range(size)]
+    level = [min(range(6), key=lambda k: abs(_CUBE_LEVELS[k] - v)) for v in values]
+    err = [(_CUBE_LEVELS[level[i]] - values[i]) ** 2 for i in range(size)]
+
+    lut = bytearray(size ** 3)
+    i = 0
+    for r in range(size):
+        vr, lr, er = values[r], level[r] * 36, err[r]
+        for g in range(size):
+            vg, lg, eg = values[g], level[g] * 6, err[g]
+            for b in range(size):
+                vb = values[b]
+                cube_err = er + eg + err[b]
+                k = min(23, max(0, ((vr + vg + vb) // 3 - 3) // 10))
+                gv = 8 + 10 * k
+                gray_err = (vr - gv) ** 2 + (vg - gv) ** 2 + (vb - gv) ** 2
+                lut[i] = 232 + k if gray_err < cube_err else 16 + lr + lg + level[b]
+                i += 1
+    return bytes(lut)
+
+def _get_color_lut() -> bytes:
+    global _color_lut
+    if _color_lut is None:
+        _color_lut = _build_color_lut()
+    return _color_lut
+
+def _rgb_plane(pix, w: int, ctype: int, bg) -> bytearray:
+    """RGB bytes for w pixels, alpha composited over the bg colour."""
+    bpp = {0: 1, 2: 3, 4: 2, 6: 4}[ctype]
+    if _backend == "numpy":
+        a = np.frombuffer(bytes(pix), dtype=np.uint8, count=w * bpp).reshape(w, bpp).astype(np.uint32)
+        rgb = np.repeat(a[:, :1], 3, axis=1) if ctype in (0, 4) else a[:, :3]
+        if ctype in (4, 6):
+            alpha = a[:, bpp - 1:bpp]
+            rgb = (rgb * alpha + np.array(bg, dtype=np.uint32) * (255 - alpha)) // 255
+        return bytearray(rgb.astype(np.uint8).tobytes())
+
+    if ctype == 2:
+        return bytearray(pix[:w * 3])
+    out = bytearray(w * 3)
+    if ctype == 0:
+        out[0::3] = out[1::3] = out[2::3] = pix[:w]
+    elif ctype == 4:
+        bg_r, bg_g, bg_b = bg
+        for i in range(w):
+            g, alpha = pix[2 * i], pix[2 * i + 1]
+            inv = 255 - alpha
+            out[3 * i] = (g * alpha + bg_r * inv) // 255
+            out[3 * i + 1] = (g * alpha + bg_g * inv) // 255
+            out[3 * i + 2] = (g * alpha + bg_b * inv) // 255
+    elif ctype == 6:
+        bg_r, bg_g, bg_b = bg
+        for i in range(w):
+            j = 4 * i
+            alpha = pix[j + 3]
+            inv = 255 - alpha
+            out[3 * i] = (pix[j] * alpha + bg_r * inv) // 255
+            out[3 * i + 1] = (pix[j + 1] * alpha + bg_g * inv) // 255
+            out[3 * i + 2] = (pix[j + 2] * alpha + bg_b * inv) // 255
+    return out
+
+def _cube_codes(rgb) -> bytes:
+    """xterm-256 code per RGB pixel, through the 32x32x32 table."""
+    lut = _get_color_lut()
+    shift = 8 - _LUT_BITS
+    if _backend == "numpy":
+        a = np.frombuffer(bytes(rgb), dtype=np.uint8).reshape(-1, 3) >> shift
+        idx = (a[:, 0].astype(np.uint32) << (2 * _LUT_BITS)) | (a[:, 1].astype(np.uint32) << _LUT_BITS) | a[:, 2]
+        return np.frombuffer(lut, dtype=np.uint8)[idx].tobytes()
+    hi, mid = 2 * _LUT_BITS, _LUT_BITS
+    return bytes(lut[((r >> shift) << hi) | ((g >> shift) << mid) | (b >> shift)]
+                 for r, g, b in zip(rgb[0::3], rgb[1::3], rgb[2::3]))
+
+def _packed_rgb(rgb) -> list:
+    """0xRRGGBB per pixel, the truecolor codes for _halfblock_line."""
+    if _backend == "numpy":
+        a = np.frombuffer(bytes(rgb), dtype=np.uint8).reshape(-1, 3).astype(np.uint32)
+        return ((a[:, 0] << 16) | (a[:, 1] << 8) | a[:, 2]).tolist()
+    return [(r << 16) | (g << 8) | b for r, g, b in zip(rgb[0::3], rgb[1::3], rgb[2::3])]
+
+def _row_codes(row, w: int, ctype: int, bg, bg_l: int, mode: str):
+    if mode == "gray":
+        return _gray_plane(row, w, 1, ctype, bg_l).translate(_GRAY_CODES)
+    rgb = _rgb_plane(row, w, ctype, bg)
+    if mode == "256":
+        return _cube_codes(rgb)
+    return _packed_rgb(rgb)
+
+# Rendering is cached at two levels: scaled pixel buffers in memory, keyed
+# by the file's identity and target size, and the final ANSI text on disk
+# (opt-in, see enable_disk_cache) so an unchanged image is one file read.
+_scaled_cache = LRUCache(max_entries=16, max_bytes=8 * 1024 * 1024)
+_disk_cache = None
+
+def enable_disk_cache(directory: str = "save_data/image_cache", max_bytes: int = 8 * 1024 * 1024):
+    """Keep rendered output under `directory` (tbos-relative), at most max_bytes in total."""
+    global _disk_cache
+    _disk_cache = DiskCache(data.getPath(directory), max_bytes)
+
+def disable_disk_cache():
+    global _disk_cache
+    _disk_cache = None
+
+def _scaled_pixels(path: str, st, max_width: int, resample: str):
+    """Decode and scale to the display size: (width, height, color type, pixels)."""
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size, max_width, resample)
+    hit = _scaled_cache.get(key)
+    if hit is not None:
+        return hit
+
+    with _PngStream(path) as png:
+        w, h, ctype = png.width, png.height, png.color_type
+
+        target_w = min(w, max_width)
+        scale = target_w / w
+        target_h = max(1, int(h * scale))
+        if target_h % 2 == 1:
+            target_h += 1
+
+        if target_w == w and target_h == h:
+            rows = png.rows()
+        elif resample == "box":
+            rows = _box_resize_rows(enumerate(png.rows()), w, h, png.bpp, target_w, target_h)
+        else:
+            rows = png.sampled_rows(_nearest_rows(h, target_h))
+            rows = _nearest_resize_rows(rows, w, h, png.bpp, target_w, target_h)
+        pixels = b"".join(rows)
 
-    w, h, ctype, pix = _read_png_8bit_noninterlaced(path)
+    result = (target_w, target_h, ctype, pixels)
+    _scaled_cache.put(key, result, size=len(pixels))
+    return result
+
+def render_png_ansi(path: str, max_width: int | None = None, bg=(0, 0, 0), resample: str = "nearest",
+                    mode: str = "gray") -> str:
+    """
+    The text display_png_ansi prints, from the caches when possible.
+    mode is "gray" (ANSI 256 gray ramp), "256" (6x6x6 cube plus gray ramp)
+    or "truecolor" (24-bit escapes).
+    """
+    if resample not in ("nearest", "box"):
+        raise ValueError(f"unknown resample mode: {resample}")
+    if mode not in _COLOR_MODES:
+        raise ValueError(f"unknown color mode: {mode}")
 
     term_cols = shutil.get_terminal_size((80, 24)).columns
     if max_width is None:
         max_width = max(10, term_cols - 1)
 
-    target_w = min(w, max_width)
-    scale = target_w / w
-    target_h = max(1, int(h * scale))
-    if target_h % 2 == 1:
-        target_h += 1
+    st = os.stat(path)
+    key = (mode, os.path.abspath(path), st.st_mtime_ns, st.st_size, max_width, tuple(bg), resample)
+    if _disk_cache is not None:
+        text = _disk_cache.get(key)
+        if text is not None:
+            return text
 
-    bpp = {0: 1, 2: 3, 4: 2, 6: 4}[ctype]
-    if target_w != w or target_h != h:
-        pix = _nearest_resize(w, h, pix, bpp, target_w, target_h)
-        w, h = target_w, target_h
+    w, h, ctype, pix = _scaled_pixels(path, st, max_width, resample)
+    stride = w * {0: 1, 2: 3, 4: 2, 6: 4}[ctype]
 
     bg_r, bg_g, bg_b = bg
     bg_l = (bg_r * 299 + bg_g * 587 + bg_b * 114) // 1000
+    tables = (_FG24, _BG24, _FG_BG24) if mode == "truecolor" else (_FG, _BG, _FG_BG)
 
-    def gray_at(x, y):
-        i = (y * w + x) * bpp
-        if ctype == 0:  # G
-            return pix[i]
-        if ctype == 2:  # RGB
-            r, g, b = pix[i], pix[i + 1], pix[i + 2]
-            return (r * 299 + g * 587 + b * 114) // 1000
-        if ctype == 4:  # GA
-            g, a = pix[i], pix[i + 1]
-            if a == 255:
-                return g
-            if a == 0:
-                return bg_l
-            return (g * a + bg_l * (255 - a)) // 255
-        if ctype == 6:  # RGBA
-            r, g, b, a = pix[i], pix[i + 1], pix[i + 2], pix[i + 3]
-            lum = (r * 299 + g * 587 + b * 114) // 1000
-            if a == 255:
-                return lum
-            if a == 0:
-                return bg_l
-            return (lum * a + bg_l * (255 - a)) // 255
-        raise AssertionError("unreachable")
-
-    reset = "\x1b[0m"
     lines = []
     for y in range(0, h, 2):
-        line = []
-        for x in range(w):
-            top = _gray_to_ansi256(gray_at(x, y))
-            bot = _gray_to_ansi256(gray_at(x, y + 1))
-            line.append(f"\x1b[38;5;{top}m\x1b[48;5;{bot}m▀")
-        line.append(reset)
-        lines.append("".join(line))
-
-    print("\n".join(lines))
+        top = _row_codes(pix[y * stride:(y + 1) * stride], w, ctype, bg, bg_l, mode)
+        bot = _row_codes(pix[(y + 1) * stride:(y + 2) * stride], w, ctype, bg, bg_l, mode)
+        lines.append(_halfblock_line(top, bot, *tables))
+    text = "\n".join(lines)
+
+    if _disk_cache is not None:
+        _disk_cache.put(key, text)
+    return text
+
+def render_png_grayscale_ansi256(path: str, max_width: int | None = None, bg=(0, 0, 0), resample: str = "nearest") -> str:
+    return render_png_ansi(path, max_width, bg, resample, "gray")
+
+def display_png_ansi(path: str, max_width: int | None = None, bg=(0, 0, 0), resample: str = "nearest",
+                     mode: str | None = None):
+    """Render PNG to the terminal in colour; mode defaults to detect_color_mode()."""
+    terminal.enable_vt_mode()
+    print(render_png_ansi(path, max_width, bg, resample, mode or detect_color_mode()))
+
+def display_png_grayscale_ansi256(path: str, max_width: int | None = None, bg=(0, 0, 0), resample: str = "nearest"):
+    """
+    Render PNG to terminal using ANSI 256-color grayscale.
+
+    Supports:
+      - PNG bit depth 8
+      - non-interlaced
+      - color types 0,2,4,6
+
+    Uses '▀' where FG is top pixel and BG is bottom pixel.
+
+    The image is scaled while it is decoded: "nearest" only unfilters the
+    rows it samples (and what they depend on), "box" averages every source
+    pixel into the cell that covers it.
+    """
+    terminal.enable_vt_mode()
+    print(render_png_grayscale_ansi256(path, max_width, bg, resample))
+
+def display_prompt():
+    """Shell entry point for the `display` command: ask for a path and render it."""
+    print("enter file path:")
+    path = input("display> ")
+
+    if path != "":
+        if _disk_cache is None:
+            enable_disk_cache()
+        try:
+            display_png_ansi(path)
+        except Exception:
+            print("could not find image")
+
+# -- gallery ------------------------------------------------------------------
+_TILE_GAP = "  "
+
+def _init_gallery_worker(backend: str, cache):
+    """Pool initializer: same backend and disk cache as the shell process."""
+    global _disk_cache
+    set_backend(backend)
+    _disk_cache = None if cache is None else DiskCache(*cache)
+
+def _thumbnail(path: str, tile_w: int, max_rows: int, mode: str, bg):
+    """
+    Render one gallery tile, fitted into tile_w columns by max_rows lines.
+    Runs in a worker process; returns (lines, visible width).
+    """
+    try:
+        with _PngStream(path) as png:
+            w, h = png.width, png.height
+        width = max(1, min(tile_w, w, (w * max_rows * 2) // max(1, h)))
+        return render_png_ansi(path, width, bg, "nearest", mode).split("\n"), width
+    except Exception:
+        text = "(unreadable)"[:tile_w]
+        return [text], len(text)
+
+def _gallery_row(tiles, names, tile_w: int) -> str:
+    height = max(len(lines) for lines, _width in tiles)
+    out = []
+    for i in range(height):
+        cells = []
+        for lines, width in tiles:
+            if i < len(lines):
+                cells.append(lines[i] + " " * (tile_w - width))
+            else:
+                cells.append(" " * tile_w)
+        out.append(_TILE_GAP.join(cells))
+    out.append(_TILE_GAP.join(name[:tile_w].ljust(tile_w) for name in names))
+    return "\n".join(out)
+
+def gallery(directory: str = ".", tile_width: int = 24, workers: int | None = None, mode: str | None = None,
+            bg=(0, 0, 0)) -> int:
+    """
+    Show every .png in `directory` as a grid of thumbnails.
+
+    Tiles are decoded and scaled on a ProcessPoolExecutor, since unfiltering
+    is CPU-bound and holds the GIL. Each grid row is printed as soon as its
+    tiles are done, while the workers go on with later ones. Returns the
+    number of images shown.
+    """
+    names = sorted(e.name for e in os.scandir(directory) if e.is_file() and e.name.lower().endswith(".png"))
+    if not names:
+        print(f"no .png files in {directory}")
+        return 0
+
+    terminal.enable_vt_mode()
+    mode = mode or detect_color_mode()
+    term_cols = shutil.get_terminal_size((80, 24)).columns
+    tile_w = max(4, min(tile_width, term_cols))
+    columns = max(1, (term_cols + len(_TILE_GAP)) // (tile_w + len(_TILE_GAP)))
+    args = [(os.path.join(directory, name), tile_w, tile_w // 2, mode, bg) for name in names]
+
+    pool = None
+    if workers != 1 and len(names) > 1:
+        cache = None if _disk_cache is None else (_disk_cache.directory, _disk_cache.max_bytes)
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_gallery_worker,
+                                       initargs=(_backend, cache))
+        except (ImportError, NotImplementedError, OSError):
+            pool = None  # no process support here: render in this process
+
+    try:
+        if pool is None:
+            get = lambda i: _thumbnail(*args[i])
+        else:
+            futures = [pool.submit(_thumbnail, *a) for a in args]
+            get = lambda i: futures[i].result()
+        for start in range(0, len(names), columns):
+            end = min(start + columns, len(names))
+            tiles = [get(i) for i in range(start, end)]
+            print(_gallery_row(tiles, names[start:end], tile_w), flush=True)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return len(names)
+
+def gallery_command(directory: str = "."):
+    """Shell entry point for `gallery [dir]`."""
+    if _disk_cache is None:
+        enable_disk_cache()
+    if not os.path.isdir(directory):
+        print("could not find folder")
+        return
+    gallery(directory)
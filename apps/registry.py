@@ -0,0 +1,106 @@
+import importlib
+
+
+class App:
+    """
+    Describes one tbos app without importing it.
+
+    commands maps a shell command to (entry, args): the name of a function in
+    `module` and the positional arguments it is called with. Commands listed
+    in arg_commands also accept the rest of the input line as one more
+    argument (see resolve). The module is imported the first time one of its
+    commands is run.
+    """
+
+    def __init__(self, name, module, commands, install_id=None, install_text="", missing_text=None,
+                 arg_commands=()):
+        self.name = name
+        self.module = module
+        self.commands = commands
+        self.arg_commands = set(arg_commands)
+        self.install_id = install_id
+        self.install_text = install_text
+        if missing_text is None:
+            missing_text = f"{name} not installed yet. install with: install {name}"
+        self.missing_text = missing_text
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self.module)
+        return self._module
+
+    def run(self, command, *extra):
+        entry, args = self.commands[command]
+        return getattr(self.load(), entry)(*args, *extra)
+
+
+APPS = [
+    App("snake", "apps.snake", {"run snake": ("snake_main", ())}, install_id=1,
+        install_text="installed snake"),
+    App("tetris", "apps.tetris", {"run tetris": ("tetris", ())}, install_id=2,
+        install_text="installed tetris"),
+    App("img", "apps.image", {"display": ("display_prompt", ()), "gallery": ("gallery_command", ())}, install_id=3,
+        install_text="""
+installed image --> terminal extension!
+new commands:
+
+display: opens display submenu
+[path]: loads .png files when in the display submenu
+gallery [dir]: shows thumbnails of every .png in a folder
+      """,
+        missing_text="invalid command! see commands with: help", arg_commands={"gallery"}),
+    App("screensaver", "apps.screensaver", {"screensaver": ("matrix_screensaver", (30, 0.035))}),
+    App("text_editor", "apps.text_editor", {"file write": ("main", ()), "file open": ("open_main", ())}),
+]
+
+
+def build_commands(apps, is_installed, install):
+    """
+    Build the shell's command table: command string -> handler. Handlers
+    take no arguments, except those of arg_commands (use resolve()).
+
+    is_installed(app) decides whether a gated app may run, install(app) is
+    called for `install <name>`. Lookups are a single dict access no matter
+    how many apps are registered.
+    """
+    table = {}
+    for app in apps:
+        for command in app.commands:
+            table[command] = _make_runner(app, command, is_installed)
+        if app.install_id is not None:
+            table["install " + app.name] = _make_installer(app, install)
+    return table
+
+
+def resolve(table, line):
+    """
+    Find the handler for an input line: (handler, extra args), or (None, ()).
+    An exact match wins; otherwise the first word is looked up and, if that
+    command takes an argument, the rest of the line is passed as one.
+    """
+    handler = table.get(line)
+    if handler is not None:
+        return handler, ()
+    name, _, rest = line.partition(" ")
+    handler = table.get(name)
+    rest = rest.strip()
+    if handler is not None and getattr(handler, "takes_arg", False) and rest:
+        return handler, (rest,)
+    return None, ()
+
+
+def _make_runner(app, command, is_installed):
+    def handler(*extra):
+        if app.install_id is not None and not is_installed(app):
+            print(app.missing_text)
+            return
+        app.run(command, *extra)
+    handler.takes_arg = command in app.arg_commands
+    return handler
+
+
+def _make_installer(app, install):
+    def handler():
+        install(app)
+    return handler
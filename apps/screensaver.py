@@ -1,32 +1,195 @@
-import sys, random, shutil, os, time
+import sys, random, shutil
+
+from utils import terminal
+from utils.frames import FrameClock
+from utils.keyboard import Keyboard
+
+try:
+    import numpy as np
+except ImportError:  # optional: MatrixRain has a pure-Python path
+    np = None
 
 def clear():
-    os.system("cls")
+    terminal.clear_screen()
+
+# ANSI
+HIDE_CURSOR = "\033[?25l"
+SHOW_CURSOR = "\033[?25h"
+RESET = "\033[0m"
+
+# Colors (bright head, then a trail that dims as it ages)
+GREEN = "\033[32m"
+BRIGHT = "\033[1m"
+DIM = "\033[2m"
+HEAD = GREEN + BRIGHT
+NEAR = GREEN
+FAR = GREEN + DIM
+
+# Character set (Matrix-y)
+CHARSET = "アイウエオカキクケコサシスセソタチツテトナニヌネノ" \
+          "ハヒフヘホマミムメモヤユヨラリルレロワヲン" \
+          "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
 
-def _get_keypress_checker():
+
+IDLE = -(1 << 30)  # drop row of a column with no drop
+
+
+class MatrixRain:
     """
-    Returns a function key_pressed() -> bool that becomes True when user presses any key.
+    Matrix rain rendered incrementally, column by column.
+
+    Each column holds at most one drop, so its whole state is the head's
+    row, speed and tick. A cell's look depends only on how far it is
+    behind the head, which means a step that moves a head changes a fixed
+    handful of cells in that column: the new head, the cells crossing a
+    fade step, and the cell falling off the end of the trail. step()
+    returns cursor-addressed writes for just those cells, grouped by style.
+
+    Glyphs on screen live in a bytearray indexed y * cols + x (0 = empty,
+    otherwise 1 + index into CHARSET), filled from a pool of pre-drawn
+    random glyphs. With numpy the per-column ticking is done on whole
+    arrays, so a frame costs a few array operations plus the columns that
+    actually moved.
     """
-    if os.name == "nt":
-        import msvcrt
-        def key_pressed():
-            return msvcrt.kbhit()
-        return key_pressed
-    else:
-        import select
-        import termios
-        import tty
-
-        fd = sys.stdin.fileno()
-        old = termios.tcgetattr(fd)
-        tty.setcbreak(fd)  # immediate keypress (no Enter)
-        def key_pressed():
-            r, _, _ = select.select([sys.stdin], [], [], 0)
-            return bool(r)
-        # also return a cleanup function for terminal state
-        def cleanup():
-            termios.tcsetattr(fd, termios.TCSADRAIN, old)
-        return key_pressed, cleanup
+
+    TRAIL_LEN = 11        # rows of trail behind a head
+    FADE_STEPS = (1, 4)   # distance where a cell turns NEAR, then FAR
+    POOL_SIZE = 4096
+
+    def __init__(self, cols, rows, density=0.035, rng=random, use_numpy=None):
+        self.density = density
+        self.rng = rng
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        if self.use_numpy:
+            self._np_rng = np.random.default_rng(rng.randrange(1 << 32))
+        self._pool = bytes(rng.randrange(len(CHARSET)) + 1 for _ in range(self.POOL_SIZE))
+        self._pool_at = 0
+        self.cols = self.rows = 0
+        self.cells = bytearray()
+        self.drops = self.speeds = self.ticks = []
+        self.resize(cols, rows)
+
+    def resize(self, cols, rows):
+        """
+        Adopt a new screen size, keeping the rain in the overlapping area.
+        The next step() clears the screen and repaints what is kept.
+        """
+        old_cols, old_rows, old_cells = self.cols, self.rows, self.cells
+        cells = bytearray(cols * rows)
+        keep = min(cols, old_cols)
+        for y in range(min(rows, old_rows)):
+            cells[y * cols:y * cols + keep] = old_cells[y * old_cols:y * old_cols + keep]
+
+        def fit(values, fill):
+            values = list(values[:keep]) + [fill] * (cols - keep)
+            return np.array(values, dtype=np.int64) if self.use_numpy else values
+
+        self.drops = fit(self.drops, IDLE)  # head row per column
+        self.speeds = fit(self.speeds, 1)   # frames per row
+        self.ticks = fit(self.ticks, 0)
+        self.cols, self.rows, self.cells = cols, rows, cells
+        self._repaint = True
+
+    @staticmethod
+    def style_at(distance):
+        if distance == 0:
+            return HEAD
+        return NEAR if distance < MatrixRain.FADE_STEPS[1] else FAR
+
+    def glyph_at(self, x, y):
+        g = self.cells[y * self.cols + x]
+        return CHARSET[g - 1] if g else " "
+
+    def _next_glyph(self):
+        g = self._pool[self._pool_at]
+        self._pool_at = (self._pool_at + 1) % self.POOL_SIZE
+        return g
+
+    def _advance(self):
+        """Spawn and tick every column; returns (x, new head row) for the heads that moved."""
+        if self.use_numpy:
+            return self._advance_numpy()
+        rows, rng = self.rows, self.rng
+        drops, speeds, ticks = self.drops, self.speeds, self.ticks
+        moved = []
+        for x in range(self.cols):
+            y = drops[x]
+            if y == IDLE:
+                # chance to spawn a new drop
+                if rng.random() < self.density:
+                    drops[x] = rng.randint(-rows, 0)  # start above screen sometimes
+                    speeds[x] = rng.randint(1, 3)
+                    ticks[x] = 0
+                continue
+
+            ticks[x] += 1
+            # control speed: only move when tick hits threshold
+            if ticks[x] < speeds[x]:
+                continue
+            ticks[x] = 0
+            drops[x] = y + 1
+            moved.append((x, y + 1))
+        return moved
+
+    def _advance_numpy(self):
+        drops, speeds, ticks, gen = self.drops, self.speeds, self.ticks, self._np_rng
+        active = drops != IDLE
+        spawn = ~active & (gen.random(self.cols) < self.density)
+        n = int(spawn.sum())
+        if n:
+            drops[spawn] = gen.integers(-self.rows, 1, n)
+            speeds[spawn] = gen.integers(1, 4, n)
+            ticks[spawn] = 0
+        ticks[active] += 1
+        move = active & (ticks >= speeds)
+        ticks[move] = 0
+        drops[move] += 1
+        xs = np.flatnonzero(move)
+        return list(zip(xs.tolist(), drops[xs].tolist()))
+
+    def step(self):
+        """Advance one frame; returns the escapes that update the screen."""
+        cols, rows, cells, drops = self.cols, self.rows, self.cells, self.drops
+        updates = {HEAD: [], NEAR: [], FAR: [], "": []}
+        expire = self.TRAIL_LEN + 1
+
+        for x, y in self._advance():
+            if 0 <= y < rows:
+                g = self._next_glyph()
+                cells[y * cols + x] = g
+                updates[HEAD].append((x, y, CHARSET[g - 1]))
+            for d in self.FADE_STEPS:
+                if 0 <= y - d < rows:
+                    updates[self.style_at(d)].append((x, y - d, self.glyph_at(x, y - d)))
+            if 0 <= y - expire < rows:
+                cells[(y - expire) * cols + x] = 0
+                updates[""].append((x, y - expire, " "))
+            if y - expire >= rows - 1:
+                drops[x] = IDLE  # trail has left the screen
+
+        parts = []
+        if self._repaint:
+            parts.append(terminal.CLEAR)
+            self._repaint = False
+            repaint = {HEAD: [], NEAR: [], FAR: []}
+            for x in range(cols):
+                y = int(drops[x])
+                if y == IDLE:
+                    continue
+                for d in range(self.TRAIL_LEN + 1):
+                    if 0 <= y - d < rows and cells[(y - d) * cols + x]:
+                        repaint[self.style_at(d)].append((x, y - d, self.glyph_at(x, y - d)))
+            updates = repaint
+        styled = False
+        for style, cells_out in updates.items():
+            if cells_out:
+                parts.append(RESET + style)
+                parts.extend(terminal.move(x, y) + ch for x, y, ch in cells_out)
+                styled = True
+        if styled:
+            parts.append(RESET)
+        return "".join(parts)
+
 
 def matrix_screensaver(fps=30, density=0.035):
     """
@@ -36,153 +199,44 @@ def matrix_screensaver(fps=30, density=0.035):
     Args:
         fps: frames per second (higher = faster)
         density: spawn chance per column per frame (higher = more rain)
+
+    Frames are paced by a FrameClock; when drawing can't keep up the
+    density is lowered until it can, and raised back once there is slack.
     """
-    # ANSI
-    HIDE_CURSOR = "\033[?25l"
-    SHOW_CURSOR = "\033[?25h"
-    CLEAR = "\033[2J"
-    HOME = "\033[H"
-    RESET = "\033[0m"
-
-    # Colors (bright head + dim trail)
-    GREEN = "\033[32m"
-    BRIGHT = "\033[1m"
-    DIM = "\033[2m"
-
-    # Character set (Matrix-y)
-    charset = "アイウエオカキクケコサシスセソタチツテトナニヌネノ" \
-              "ハヒフヘホマミムメモヤユヨラリルレロワヲン" \
-              "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-
-    # Setup keypress handling
-    cleanup = None
-    if os.name == "nt":
-        key_pressed = _get_keypress_checker()
-    else:
-        key_pressed, cleanup = _get_keypress_checker()
+    # Keys are read (and swallowed) by the keyboard thread, so none leak into the shell after exit
+    keyboard = Keyboard().start()
+    terminal.enable_vt_mode()
 
     cols, rows = shutil.get_terminal_size((120, 40))
-
-    # Each column has a drop position;  -1 means inactive
-    drops = [-1 for _ in range(cols)]
-    speeds = [random.randint(1, 3) for _ in range(cols)]  # how many rows per frame-ish
-    tick = [0 for _ in range(cols)]  # per-column timing accumulator
-
-    # We maintain a lightweight "trail" intensity map: dict[(x,y)] = age
-    # Age grows each frame; we render younger = brighter.
-    trail = {}
+    rain = MatrixRain(cols, rows, density)
+    clock = FrameClock(1 / max(1, fps))
 
     def draw():
-        nonlocal cols, rows
-        cols, rows = shutil.get_terminal_size((cols, rows))
-
-        # Frame buffer as list of strings for speed
-        frame_lines = [" " * cols for _ in range(rows)]
-        # We'll overlay characters by building per-line mutable lists
-        frame = [list(line) for line in frame_lines]
-        style_map = {}  # (x,y)-> style token ("head","trail")
-
-        # Age existing trail (and drop old)
-        to_del = []
-        for (x, y), age in trail.items():
-            age += 1
-            if age > 10:   # trail length / fade duration
-                to_del.append((x, y))
-            else:
-                trail[(x, y)] = age
-        for k in to_del:
-            del trail[k]
-
-        # Spawn/update drops
-        for x in range(cols):
-            if drops[x] < 0:
-                # chance to spawn a new drop
-                if random.random() < density:
-                    drops[x] = random.randint(-rows, 0)  # start above screen sometimes
-                    speeds[x] = random.randint(1, 3)
-                    tick[x] = 0
-                continue
-
-            tick[x] += 1
-            # control speed: only move when tick hits threshold
-            if tick[x] < speeds[x]:
-                continue
-            tick[x] = 0
-
-            drops[x] += 1
-            y = drops[x]
-
-            # if it goes off screen, deactivate
-            if y > rows + 10:
-                drops[x] = -1
-                continue
-
-            # Head character (bright)
-            if 0 <= y < rows:
-                ch = random.choice(charset)
-                frame[y][x] = ch
-                style_map[(x, y)] = "head"
-
-            # Trail behind head (dim)
-            for t in range(1, 12):
-                ty = y - t
-                if 0 <= ty < rows:
-                    # store trail age: younger nearer head
-                    trail[(x, ty)] = min(trail.get((x, ty), 10), t)
-
-        # Apply trail rendering
-        for (x, y), age in trail.items():
-            if 0 <= y < rows and 0 <= x < cols:
-                frame[y][x] = random.choice(charset)
-                style_map[(x, y)] = "trail"
-
-        # Convert to ANSI output with minimal color switches
-        out = [HOME]
-        for y in range(rows):
-            line_out = []
-            current_style = None
-            for x in range(cols):
-                st = style_map.get((x, y))
-                if st != current_style:
-                    if st == "head":
-                        line_out.append(GREEN + BRIGHT)
-                    elif st == "trail":
-                        line_out.append(GREEN + DIM)
-                    else:
-                        line_out.append(RESET)
-                    current_style = st
-                line_out.append(frame[y][x])
-            line_out.append(RESET)
-            out.append("".join(line_out))
-        return "\n".join(out)
+        size = shutil.get_terminal_size((rain.cols, rain.rows))
+        if size != (rain.cols, rain.rows):
+            rain.resize(*size)
+        return rain.step()
 
     # Render loop
     try:
-        sys.stdout.write(CLEAR + HOME + HIDE_CURSOR)
+        sys.stdout.write(HIDE_CURSOR)
         sys.stdout.flush()
 
+        clock.start()
         while True:
-            if key_pressed():
+            if keyboard.pending():
                 break
             sys.stdout.write(draw())
             sys.stdout.flush()
-            time.sleep(1 / max(1, fps))
+            clock.tick()
+            if clock.load > 0.9:
+                rain.density = max(density / 4, rain.density * 0.9)
+            elif clock.load < 0.5 and rain.density < density:
+                rain.density = min(density, rain.density * 1.05)
 
     finally:
-        # consume the keypress so it doesn't type into your shell after exit
-        try:
-            if os.name == "nt":
-                import msvcrt
-                if msvcrt.kbhit():
-                    msvcrt.getch()
-            else:
-                if key_pressed():
-                    sys.stdin.read(1)
-        except Exception:
-            pass
-
-        if cleanup:
-            cleanup()
+        keyboard.stop()
         sys.stdout.write(RESET + SHOW_CURSOR + "\n")
         sys.stdout.flush()
-        clear()
\ No newline at end of file
+        clear()
+        clock.report()
\ No newline at end of file
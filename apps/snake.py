@@ -1,4 +1,8 @@
-import os, time, msvcrt, random
+import random
+
+from utils.frames import FrameClock
+from utils.keyboard import Keyboard
+from utils.terminal import FrameBuffer, HIDE_CURSOR
 
 def snake_main():
     # Board size (playable area)
@@ -11,21 +15,16 @@ def snake_main():
     FOOD = "<>"
     WALL = "##"
 
-    def clear():
-        os.system("cls")
-
-    def read_key():
-        """Non-blocking key read. Returns 'w','a','s','d','q' or None."""
-        if not msvcrt.kbhit():
-            return None
-        ch = msvcrt.getch()
-        if ch in (b"\x00", b"\xe0"):  # special keys (arrows), ignore
-            _ = msvcrt.getch()
-            return None
-        try:
-            return ch.decode("utf-8").lower()
-        except:
-            return None
+    CONTROLS = "Controls: W/A/S/D or arrows move | Q quit"
+    screen = FrameBuffer(W * 2 + 20, H + 4)
+
+    DIRECTIONS = {
+        "w": (0, -1), "up": (0, -1),
+        "s": (0, 1), "down": (0, 1),
+        "a": (-1, 0), "left": (-1, 0),
+        "d": (1, 0), "right": (1, 0),
+    }
+    MAX_TURNS = 3  # direction keys buffered ahead of the snake
 
     def place_food(snake_set):
         while True:
@@ -35,8 +34,8 @@ def snake_main():
                 return (fx, fy)
 
     def draw(snake, food, score, speed):
-        clear()
-        print("+" + "-" * (W * 2) + "+   SNAKE (ASCII)")
+        screen.clear()
+        screen.put(0, 0, "+" + "-" * (W * 2) + "+   SNAKE (ASCII)")
         snake_set = set(snake)
 
         for y in range(H):
@@ -51,11 +50,12 @@ def snake_main():
                 else:
                     row += EMPTY
             row += "|"
-            print(row)
+            screen.put(0, y + 1, row)
 
-        print("+" + "-" * (W * 2) + "+")
-        print(f"Score: {score}   Speed: {speed:.2f}s/tick")
-        print("Controls: W/A/S/D move | Q quit")
+        screen.put(0, H + 1, "+" + "-" * (W * 2) + "+")
+        screen.put(0, H + 2, f"Score: {score}   Speed: {speed:.2f}s/tick")
+        screen.put(0, H + 3, CONTROLS)
+        screen.present()
 
     def main():
         # Snake starts in the middle moving right
@@ -63,7 +63,7 @@ def snake_main():
         start_y = H // 2
         snake = [(start_x, start_y), (start_x - 1, start_y), (start_x - 2, start_y)]
         direction = (1, 0)  # dx, dy
-        pending_dir = direction
+        turns = []  # queued direction changes, one taken per tick
 
         snake_set = set(snake)
         food = place_food(snake_set)
@@ -71,63 +71,73 @@ def snake_main():
         score = 0
         base_speed = 0.12  # smaller = faster
 
-        running = True
-        while running:
-            # Speed up slightly as score increases (clamped)
-            speed = max(0.05, base_speed - score * 0.002)
-
-            # Read input (non-blocking) and update pending direction
-            key = read_key()
-            if key == "q":
-                break
-            elif key == "w":
-                pending_dir = (0, -1)
-            elif key == "s":
-                pending_dir = (0, 1)
-            elif key == "a":
-                pending_dir = (-1, 0)
-            elif key == "d":
-                pending_dir = (1, 0)
-
-            # Prevent instant reverse into itself
-            if (pending_dir[0] != -direction[0]) or (pending_dir[1] != -direction[1]):
-                direction = pending_dir
-
-            # Move snake
-            head_x, head_y = snake[0]
-            dx, dy = direction
-            new_head = (head_x + dx, head_y + dy)
-
-            # Wall collision
-            if new_head[0] == 0 or new_head[0] == W - 1 or new_head[1] == 0 or new_head[1] == H - 1:
-                draw(snake, food, score, speed)
-                print("\nGAME OVER! You hit a wall.")
-                break
+        clock = FrameClock(base_speed)
+        message = None
+        print(HIDE_CURSOR, end="")
+        keyboard = Keyboard().start()
+        clock.start()
+        try:
+            while True:
+                # Speed up slightly as score increases (clamped)
+                speed = max(0.05, base_speed - score * 0.002)
+                clock.set_period(speed)
+
+                # Take every key typed since the last tick
+                keys = [event.key.lower() for event in keyboard.events()]
+                if "q" in keys:
+                    break
+                for key in keys:
+                    if key in DIRECTIONS and len(turns) < MAX_TURNS:
+                        turns.append(DIRECTIONS[key])
+
+                # One turn per tick, skipping no-ops and instant reverses into itself
+                while turns:
+                    turn = turns.pop(0)
+                    if turn != direction and turn != (-direction[0], -direction[1]):
+                        direction = turn
+                        break
+
+                # Move snake
+                head_x, head_y = snake[0]
+                dx, dy = direction
+                new_head = (head_x + dx, head_y + dy)
+
+                # Wall collision
+                if new_head[0] == 0 or new_head[0] == W - 1 or new_head[1] == 0 or new_head[1] == H - 1:
+                    draw(snake, food, score, speed)
+                    message = "GAME OVER! You hit a wall."
+                    break
+
+                # Self collision (tail exception: if tail moves away this tick, it’s ok)
+                tail = snake[-1]
+                if new_head in snake_set and new_head != tail:
+                    draw(snake, food, score, speed)
+                    message = "GAME OVER! You ran into yourself."
+                    break
+
+                # Add head
+                snake.insert(0, new_head)
+                snake_set.add(new_head)
+
+                # Eat food?
+                if new_head == food:
+                    score += 1
+                    food = place_food(snake_set)
+                    # keep tail (snake grows)
+                else:
+                    # remove tail (snake moves)
+                    removed = snake.pop()
+                    snake_set.remove(removed)
 
-            # Self collision (tail exception: if tail moves away this tick, it’s ok)
-            tail = snake[-1]
-            if new_head in snake_set and new_head != tail:
                 draw(snake, food, score, speed)
-                print("\nGAME OVER! You ran into yourself.")
-                break
-
-            # Add head
-            snake.insert(0, new_head)
-            snake_set.add(new_head)
-
-            # Eat food?
-            if new_head == food:
-                score += 1
-                food = place_food(snake_set)
-                # keep tail (snake grows)
-            else:
-                # remove tail (snake moves)
-                removed = snake.pop()
-                snake_set.remove(removed)
-
-            draw(snake, food, score, speed)
-            time.sleep(speed)
+                clock.tick()
+        finally:
+            keyboard.stop()
+            screen.finish()
 
+        if message:
+            print("\n" + message)
         print("\nThanks for playing!")
+        clock.report()
 
     main()
\ No newline at end of file
@@ -1,4 +1,8 @@
-import os, random, msvcrt, time
+import random, time
+
+from utils.frames import FrameClock
+from utils.keyboard import Keyboard
+from utils.terminal import FrameBuffer, HIDE_CURSOR
 
 
 def tetris():
@@ -18,8 +22,9 @@ def tetris():
         [[1, 1, 0], [0, 1, 1]],          # Z
     ]
 
-    def clear_screen():
-        os.system("cls")
+    CONTROLS = "Controls: A/D or arrows = left/right | W/Up = rotate | S/Down = soft drop | Space = hard drop | Q = quit"
+    KEYS = {"left": "a", "right": "d", "up": "w", "down": "s"}
+    screen = FrameBuffer(max(len(CONTROLS), WIDTH * 2 + 20), HEIGHT + 4)
 
     def rotate_clockwise(piece):
         return [list(row) for row in zip(*piece[::-1])]
@@ -67,8 +72,8 @@ def tetris():
         return py
 
     def draw(board, piece, px, py, score, lines, level):
-        clear_screen()
-        print("+" + "-" * (WIDTH * 2) + "+   TETRIS (ASCII)")
+        screen.clear()
+        screen.put(0, 0, "+" + "-" * (WIDTH * 2) + "+   TETRIS (ASCII)")
         for y in range(HEIGHT):
             line = "|"
             for x in range(WIDTH):
@@ -81,25 +86,11 @@ def tetris():
 
                 line += (BLOCK if filled else EMPTY)
             line += "|"
-            print(line)
-        print("+" + "-" * (WIDTH * 2) + "+")
-        print(f"Score: {score}   Lines: {lines}   Level: {level}")
-        print("Controls: A/D = left/right | W = rotate | S = soft drop | Space = hard drop | Q = quit")
-
-    def read_key_nonblocking():
-        if not msvcrt.kbhit():
-            return None
-        ch = msvcrt.getch()
-
-        # Handle special keys (arrows etc.) - we ignore them
-        if ch in (b"\x00", b"\xe0"):
-            _ = msvcrt.getch()
-            return None
-
-        try:
-            return ch.decode("utf-8").lower()
-        except:
-            return None
+            screen.put(0, y + 1, line)
+        screen.put(0, HEIGHT + 1, "+" + "-" * (WIDTH * 2) + "+")
+        screen.put(0, HEIGHT + 2, f"Score: {score}   Lines: {lines}   Level: {level}")
+        screen.put(0, HEIGHT + 3, CONTROLS)
+        screen.present()
 
     def main():
         board = [[0] * WIDTH for _ in range(HEIGHT)]
@@ -112,65 +103,83 @@ def tetris():
             return
 
         fall_timer = 0.0
-        last_time = time.time()
+        keys = []  # typed but not yet applied
+        last_time = time.monotonic()
 
         # speed: higher level => faster
         level = 1
         base_fall = 0.55  # seconds per drop at level 1
 
-        running = True
-        while running:
-            now = time.time()
-            dt = now - last_time
-            last_time = now
-            fall_timer += dt
-
-            # update level based on lines
-            level = max(1, total_lines // 10 + 1)
-            fall_interval = max(0.08, base_fall - (level - 1) * 0.05)
-
-            # input
-            key = read_key_nonblocking()
-            if key == "q":
-                break
-            elif key == "a":
-                if not collision(board, piece, px - 1, py):
-                    px -= 1
-            elif key == "d":
-                if not collision(board, piece, px + 1, py):
-                    px += 1
-            elif key == "w":
-                rotated = rotate_clockwise(piece)
-                if not collision(board, rotated, px, py):
-                    piece = rotated
-            elif key == "s":
-                if not collision(board, piece, px, py + 1):
-                    py += 1
-            elif key == " ":
-                py = hard_drop(board, piece, px, py)
-                fall_timer = fall_interval  # force lock check soon
-
-            # gravity
-            if fall_timer >= fall_interval:
-                fall_timer = 0.0
-                if not collision(board, piece, px, py + 1):
-                    py += 1
-                else:
-                    # lock
-                    merge(board, piece, px, py)
-                    board, cleared = clear_lines(board)
-                    if cleared:
-                        total_lines += cleared
-                        # scoring (simple)
-                        score += [0, 100, 300, 500, 800][cleared] * level
-
-                    piece, px, py = spawn_piece()
-                    if collision(board, piece, px, py):
-                        draw(board, piece, px, py, score, total_lines, level)
-                        print("\nGAME OVER!")
+        clock = FrameClock(0.02)
+        message = None
+        print(HIDE_CURSOR, end="")
+        keyboard = Keyboard().start()
+        clock.start()
+        try:
+            while True:
+                now = time.monotonic()
+                dt = now - last_time
+                last_time = now
+                fall_timer += dt
+
+                # update level based on lines
+                level = max(1, total_lines // 10 + 1)
+                fall_interval = max(0.08, base_fall - (level - 1) * 0.05)
+
+                # input: every key typed since the last tick, in order
+                for event in keyboard.events():
+                    key = event.key.lower()
+                    keys.append(KEYS.get(key, key))
+                if "q" in keys:
+                    break
+                while keys:
+                    key = keys.pop(0)
+                    if key == "a":
+                        if not collision(board, piece, px - 1, py):
+                            px -= 1
+                    elif key == "d":
+                        if not collision(board, piece, px + 1, py):
+                            px += 1
+                    elif key == "w":
+                        rotated = rotate_clockwise(piece)
+                        if not collision(board, rotated, px, py):
+                            piece = rotated
+                    elif key == "s":
+                        if not collision(board, piece, px, py + 1):
+                            py += 1
+                    elif key == " ":
+                        py = hard_drop(board, piece, px, py)
+                        fall_timer = fall_interval  # lock now; keys after the drop go to the next piece
                         break
 
-            draw(board, piece, px, py, score, total_lines, level)
-            time.sleep(0.02)
+                # gravity
+                if fall_timer >= fall_interval:
+                    fall_timer = 0.0
+                    if not collision(board, piece, px, py + 1):
+                        py += 1
+                    else:
+                        # lock
+                        merge(board, piece, px, py)
+                        board, cleared = clear_lines(board)
+                        if cleared:
+                            total_lines += cleared
+                            # scoring (simple)
+                            score += [0, 100, 300, 500, 800][cleared] * level
+
+                        piece, px, py = spawn_piece()
+                        if collision(board, piece, px, py):
+                            draw(board, piece, px, py, score, total_lines, level)
+                            message = "GAME OVER!"
+                            break
+
+                draw(board, piece, px, py, score, total_lines, level)
+                clock.tick()
+        finally:
+            keyboard.stop()
+            screen.finish()
+
+        if message:
+            print("\n" + message)
+        clock.report()
 
     main()
\ No newline at end of file
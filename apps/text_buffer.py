@@ -0,0 +1,507 @@
+import mmap
+import os
+import threading
+from array import array
+
+from utils import data
+
+_BLOCK = 128  # pieces per block before it is split
+_PIECE_LINES = 32  # newlines per piece when inserting long text
+_LINE_STRIDE = 64  # MappedFile remembers the offset of every 64th line
+_SCAN_STEP = 4 * 1024 * 1024
+
+
+class PieceTable:
+    """
+    Text buffer for the editor.
+
+    The document is a sequence of pieces, each a (text, start, length,
+    newlines) view into a string that is never copied: the initial text or
+    the string passed to one insert(). Pieces are grouped into small blocks
+    that cache their character and newline totals. Fenwick trees over those
+    totals find the block holding a position or line, and absorb an edit's
+    change to one block, in O(log blocks); the rest is a short scan of one
+    block. Only splitting or dropping a block rebuilds the trees.
+    """
+
+    def __init__(self, text=""):
+        self._blocks = [[[], 0, 0]]  # [pieces, chars, newlines]
+        self._length = 0
+        self._newlines = 0
+        self._char_sums = None    # _Fenwick over block chars, rebuilt lazily after splits/drops
+        self._line_sums = None    # _Fenwick over block newlines
+        # called as fn(pos, removed_text, inserted_text) after every edit
+        self.listeners = []
+        if text:
+            self.insert(0, text)
+
+    # -- queries ---------------------------------------------------------------
+    def __len__(self):
+        return self._length
+
+    def __str__(self):
+        return "".join(self.iter_chunks())
+
+    def line_count(self):
+        return self._newlines + 1
+
+    def iter_chunks(self, start=0, end=None):
+        """Yield the text between start and end as slices of the underlying strings."""
+        if end is None or end > self._length:
+            end = self._length
+        if start >= end:
+            return
+        b, i, offset = self._locate(start)
+        remaining = end - start
+        while remaining > 0:
+            pieces = self._blocks[b][0]
+            if i >= len(pieces):
+                b, i = b + 1, 0
+                continue
+            text, p_start, p_len, _ = pieces[i]
+            take = min(p_len - offset, remaining)
+            yield text[p_start + offset:p_start + offset + take]
+            remaining -= take
+            offset = 0
+            i += 1
+
+    def get_text(self, start=0, end=None):
+        return "".join(self.iter_chunks(start, end))
+
+    def line_start(self, line):
+        """Offset of the first character of line `line` (0-based)."""
+        if line <= 0:
+            return 0
+        if line > self._newlines:
+            raise IndexError(f"line {line} out of range")
+        self._sums()
+        # the block holding the line-th newline
+        b, seen = self._line_sums.find(line - 1)
+        pos = self._char_sums.prefix(b)
+        for text, p_start, p_len, nl in self._blocks[b][0]:
+            if seen + nl >= line:
+                i = p_start - 1
+                for _ in range(line - seen):
+                    i = text.index("\n", i + 1)
+                return pos + (i - p_start) + 1
+            seen += nl
+            pos += p_len
+        raise AssertionError("newline totals out of sync")
+
+    def line_of(self, pos):
+        """Line number (0-based) holding character position pos."""
+        self._sums()
+        b, start = self._char_sums.find(pos)
+        line = self._line_sums.prefix(b)
+        offset = pos - start
+        for text, p_start, p_len, nl in self._blocks[b][0]:
+            if offset <= p_len:
+                return line + text.count("\n", p_start, p_start + offset)
+            line += nl
+            offset -= p_len
+        return line
+
+    def line(self, line):
+        """Text of line `line` (0-based) without its newline."""
+        start = self.line_start(line)
+        end = self.line_start(line + 1) - 1 if line < self._newlines else self._length
+        return self.get_text(start, end)
+
+    def iter_lines(self, first=0, count=None):
+        """Yield `count` lines starting at `first` without rebuilding the whole document."""
+        last = self._newlines if count is None else min(self._newlines, first + count - 1)
+        for n in range(first, last + 1):
+            yield self.line(n)
+
+    # -- edits -----------------------------------------------------------------
+    def insert(self, pos, text):
+        self._insert(pos, text)
+        if text and self.listeners:
+            self._notify(pos, "", text)
+
+    def append(self, text):
+        self.insert(self._length, text)
+
+    def delete(self, pos, length):
+        """Remove `length` characters at `pos` and return the removed text."""
+        removed = self._delete(pos, length)
+        if removed and self.listeners:
+            self._notify(pos, removed, "")
+        return removed
+
+    def replace(self, pos, length, text):
+        """Replace `length` characters at `pos` with text, reported to listeners as one edit."""
+        removed = self._delete(pos, length)
+        self._insert(pos, text)
+        if (removed or text) and self.listeners:
+            self._notify(pos, removed, text)
+        return removed
+
+    def _insert(self, pos, text):
+        if not text:
+            return
+        if pos < 0 or pos > self._length:
+            raise IndexError(f"position {pos} out of range")
+        new = _make_pieces(text)
+        newlines = sum(p[3] for p in new)
+
+        if pos == self._length:
+            b = len(self._blocks) - 1
+            self._blocks[b][0].extend(new)
+        else:
+            b, i, offset = self._locate(pos)
+            pieces = self._blocks[b][0]
+            if offset == 0:
+                pieces[i:i] = new
+            else:
+                left, right = _split_piece(pieces[i], offset)
+                pieces[i:i + 1] = [left, *new, right]
+
+        block = self._blocks[b]
+        block[1] += len(text)
+        block[2] += newlines
+        self._length += len(text)
+        self._newlines += newlines
+        self._add_to_sums(b, len(text), newlines)
+        self._split_if_full(b)
+
+    def _delete(self, pos, length):
+        if length <= 0:
+            return ""
+        if pos < 0 or pos + length > self._length:
+            raise IndexError(f"range {pos}:{pos + length} out of range")
+        removed = []
+        b, i, offset = self._locate(pos)
+        first_block = b
+        remaining = length
+        while remaining > 0:
+            block = self._blocks[b]
+            pieces = block[0]
+            if i >= len(pieces):
+                b, i, offset = b + 1, 0, 0
+                continue
+            text, p_start, p_len, nl = pieces[i]
+            take = min(p_len - offset, remaining)
+            cut = text[p_start + offset:p_start + offset + take]
+            cut_nl = cut.count("\n")
+            removed.append(cut)
+
+            keep = []
+            if offset:
+                keep.append((text, p_start, offset, text.count("\n", p_start, p_start + offset)))
+            if offset + take < p_len:
+                tail_start = p_start + offset + take
+                tail_len = p_len - offset - take
+                keep.append((text, tail_start, tail_len, text.count("\n", tail_start, tail_start + tail_len)))
+            pieces[i:i + 1] = keep
+            i += len(keep)
+            offset = 0
+
+            block[1] -= take
+            block[2] -= cut_nl
+            self._length -= take
+            self._newlines -= cut_nl
+            self._add_to_sums(b, -take, -cut_nl)
+            remaining -= take
+
+        self._drop_empty(first_block, b + 1)
+        return "".join(removed)
+
+    # -- saving ----------------------------------------------------------------
+    def save(self, file_path):
+        """Stream the pieces to disk through utils.data without building the full string."""
+        data.writeChunks(file_path, self.iter_chunks())
+
+    # -- internals -------------------------------------------------------------
+    def _notify(self, pos, removed, inserted):
+        for listener in self.listeners:
+            listener(pos, removed, inserted)
+
+    def _locate(self, pos):
+        """(block, piece index, offset in piece) for a character position."""
+        self._sums()
+        b, start = self._char_sums.find(pos)
+        # skip empty blocks and land on the piece containing pos
+        offset = pos - start
+        while True:
+            pieces = self._blocks[b][0]
+            for i, piece in enumerate(pieces):
+                if offset < piece[2]:
+                    return b, i, offset
+                offset -= piece[2]
+            if b == len(self._blocks) - 1:
+                return b, len(pieces), offset
+            b += 1
+
+    def _sums(self):
+        if self._char_sums is None:
+            self._char_sums = _Fenwick([blk[1] for blk in self._blocks])
+            self._line_sums = _Fenwick([blk[2] for blk in self._blocks])
+
+    def _add_to_sums(self, b, chars, newlines):
+        if self._char_sums is not None:
+            self._char_sums.add(b, chars)
+            self._line_sums.add(b, newlines)
+
+    def _split_if_full(self, b):
+        blocks = self._blocks
+        if len(blocks[b][0]) > 2 * _BLOCK:
+            pieces = blocks[b][0]
+            parts = [pieces[k:k + _BLOCK] for k in range(0, len(pieces), _BLOCK)]
+            blocks[b:b + 1] = [[part, sum(p[2] for p in part), sum(p[3] for p in part)] for part in parts]
+            self._char_sums = self._line_sums = None
+
+    def _drop_empty(self, first, end):
+        """Remove blocks in [first, end) that an edit emptied, keeping at least one block."""
+        blocks = self._blocks
+        kept = [blk for blk in blocks[first:end] if blk[0]]
+        if len(kept) == end - first:
+            return
+        if not kept and len(blocks) == end - first:
+            kept = [[[], 0, 0]]
+        blocks[first:end] = kept
+        self._char_sums = self._line_sums = None
+
+
+class _Fenwick:
+    """Prefix sums over non-negative counts with O(log n) updates and searches."""
+
+    def __init__(self, values):
+        n = len(values)
+        tree = [0] + list(values)
+        for i in range(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self._tree = tree
+        self._n = n
+        self._top = 1 << (n.bit_length() - 1) if n else 0
+
+    def add(self, i, delta):
+        """Add delta to value i (0-based)."""
+        tree, n = self._tree, self._n
+        i += 1
+        while i <= n:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, k):
+        """Sum of the first k values."""
+        tree = self._tree
+        total = 0
+        while k > 0:
+            total += tree[k]
+            k -= k & -k
+        return total
+
+    def find(self, target):
+        """
+        (i, prefix(i)) for the last index i whose prefix is <= target,
+        i.e. the value that target falls in, clamped to the last value.
+        """
+        tree, n = self._tree, self._n
+        k = 0
+        rest = target
+        step = self._top
+        while step:
+            if k + step <= n and tree[k + step] <= rest:
+                k += step
+                rest -= tree[k]
+            step >>= 1
+        if k == n:
+            k = n - 1
+            return k, self.prefix(k)
+        return k, target - rest
+
+
+def _make_pieces(text):
+    """
+    Pieces for newly inserted text. Long text is cut every _PIECE_LINES lines
+    (still pointing into the same string) so finding a line inside a piece
+    stays a short scan.
+    """
+    newlines = text.count("\n")
+    if newlines <= _PIECE_LINES:
+        return [(text, 0, len(text), newlines)]
+    pieces = []
+    start = 0
+    i = -1
+    while True:
+        for _ in range(_PIECE_LINES):
+            i = text.find("\n", i + 1)
+            if i == -1:
+                break
+        if i == -1 or i + 1 >= len(text):
+            pieces.append((text, start, len(text) - start, text.count("\n", start)))
+            return pieces
+        pieces.append((text, start, i + 1 - start, _PIECE_LINES))
+        start = i + 1
+
+
+def _split_piece(piece, offset):
+    text, start, length, _ = piece
+    left_nl = text.count("\n", start, start + offset)
+    return (text, start, offset, left_nl), (text, start + offset, length - offset, piece[3] - left_nl)
+
+
+class MappedFile:
+    """
+    Large file opened for viewing and light editing without reading it in.
+
+    The file is memory-mapped; a background thread scans it once and keeps
+    the offset of every _LINE_STRIDE-th line, so any line is found with one
+    lookup plus a short forward scan while the whole file never becomes a
+    Python string. Only the lines asked for are decoded. Edits are kept in
+    an overlay of {line: replacement lines} in original line numbers and
+    merged into the mapped bytes when saving.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._overlay = {}
+        self._open()
+
+    def _open(self):
+        self._f = open(data.getPath(self.file_path), "rb")
+        size = os.fstat(self._f.fileno()).st_size
+        self._mm = mmap.mmap(self._f.fileno(), size, access=mmap.ACCESS_READ) if size else b""
+        self._size = size
+        self._checkpoints = array("Q", [0])  # start offset of lines 0, stride, 2*stride, ...
+        self._lines = None                    # total line count once the scan has finished
+        self._scanned = 0
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = threading.Thread(target=self._scan, name="tbos-line-index", daemon=True)
+        self._thread.start()
+
+    # -- index -----------------------------------------------------------------
+    def _scan(self):
+        mm = self._mm
+        size = self._size
+        count = 0   # newlines seen so far
+        pos = 0
+        while pos < size and not self._stop:
+            end = min(size, pos + _SCAN_STEP)
+            found = []
+            i = mm.find(b"\n", pos, end)
+            while i != -1:
+                count += 1
+                if count % _LINE_STRIDE == 0 and i + 1 < size:
+                    found.append(i + 1)
+                i = mm.find(b"\n", i + 1, end)
+            with self._cond:
+                self._checkpoints.extend(found)
+                self._scanned = end
+                self._cond.notify_all()
+            pos = end
+        with self._cond:
+            # a trailing newline doesn't start another line
+            self._lines = count + (1 if size and mm[size - 1:size] != b"\n" else 0)
+            self._cond.notify_all()
+
+    def line_count(self, wait=True):
+        """Number of lines; without wait, None while the background scan is still running."""
+        with self._cond:
+            while wait and self._lines is None:
+                self._cond.wait()
+            return self._lines
+
+    def indexed_fraction(self):
+        return 1.0 if not self._size else self._scanned / self._size
+
+    def _line_span(self, n):
+        """(start, end) byte offsets of original line n, newline excluded; None past the end."""
+        k = n // _LINE_STRIDE
+        with self._cond:
+            while len(self._checkpoints) <= k and self._lines is None:
+                self._cond.wait()
+            if len(self._checkpoints) <= k:
+                return None
+            start = self._checkpoints[k]
+        mm = self._mm
+        for _ in range(n - k * _LINE_STRIDE):
+            i = mm.find(b"\n", start)
+            if i == -1:
+                return None
+            start = i + 1
+        if start >= self._size:
+            return None
+        end = mm.find(b"\n", start)
+        return start, (self._size if end == -1 else end)
+
+    def raw_line(self, n):
+        span = self._line_span(n)
+        if span is None:
+            raise IndexError(f"line {n} out of range")
+        start, end = span
+        text = str(self._mm[start:end], "utf-8", "replace")
+        return text[:-1] if text.endswith("\r") else text
+
+    # -- viewing and editing ---------------------------------------------------
+    def window(self, first, count):
+        """Up to `count` visible lines from original line `first` on, as (line number, text) pairs."""
+        out = []
+        n = first
+        while len(out) < count:
+            if n in self._overlay:
+                out.extend((n, text) for text in self._overlay[n])
+            else:
+                try:
+                    out.append((n, self.raw_line(n)))
+                except IndexError:
+                    break
+            n += 1
+        return out[:count]
+
+    def set_line(self, n, text):
+        self.raw_line(n)  # range check
+        self._overlay[n] = text.split("\n")
+
+    def delete_line(self, n):
+        self.raw_line(n)
+        self._overlay[n] = []
+
+    def modified(self):
+        return bool(self._overlay)
+
+    def iter_chunks(self):
+        """The edited file as byte chunks: untouched runs straight from the map, overlay lines in between."""
+        pos = 0
+        for n in sorted(self._overlay):
+            start, end = self._line_span(n)
+            yield from self._copy(pos, start)
+            has_newline = end < self._size
+            if self._overlay[n]:
+                yield ("\n".join(self._overlay[n]) + ("\n" if has_newline else "")).encode("utf-8")
+            pos = end + 1 if has_newline else end
+        yield from self._copy(pos, self._size)
+
+    def _copy(self, start, end):
+        for chunk_start in range(start, end, _SCAN_STEP):
+            yield self._mm[chunk_start:min(end, chunk_start + _SCAN_STEP)]
+
+    def save(self, file_path=None):
+        """Write the merged result (to the original file by default) and reopen it."""
+        target = file_path or self.file_path
+        if target != self.file_path:
+            data.writeChunks(target, self.iter_chunks())
+            return
+        try:
+            # the map is the source, so it stays open until the new file is written
+            data.writeChunks(target, self.iter_chunks(), before_replace=self.close)
+        except BaseException:
+            if self._f.closed:
+                self._open()  # the original is still in place; keep the edits on top of it
+            raise
+        self.close()
+        self._overlay = {}
+        self._open()
+
+    def close(self):
+        if self._f.closed:
+            return
+        self._stop = True
+        self._thread.join()
+        if self._size:
+            self._mm.close()
+        self._f.close()
@@ -1,10 +1,144 @@
+import shutil
+
+from apps.text_buffer import MappedFile, PieceTable
+from apps.text_history import History
+from apps.text_search import SearchIndex
+from utils import data
+
+
 def main():
+    """
+    Line editor: every line typed is appended to the document.
+
+    Commands:
+      [save path]           write the document (and its undo history) to path
+                            (relative to the tbos folder)
+      [open path]           continue editing a saved document, undo history included
+      [undo] / [redo]       step through the edit history
+      [find text]           show the first line containing text
+      [next]                show the next match
+      [replace old -> new]  replace every occurrence
+      [exit]                leave the editor
+    """
+    buffer = PieceTable()
+    search = SearchIndex(buffer)
+    history = History(buffer)
+    pattern = ""
+    match = -1
+    first_line = True
     writing = True
-    text_content = ""
     while writing == True:
         text_input = input("")
         if text_input == "[exit]":
             writing = False
-        if writing:
-            text_content += text_input
-    return text_content
+        elif text_input.startswith("[save ") and text_input.endswith("]"):
+            path = text_input[len("[save "):-1].strip()
+            buffer.save(path)
+            history.save(path + ".undo")
+            print(f"saved {buffer.line_count()} lines to {path}")
+        elif text_input.startswith("[open ") and text_input.endswith("]"):
+            path = text_input[len("[open "):-1].strip()
+            if not data.getFileExists(path):
+                print("file not found")
+                continue
+            buffer = PieceTable(data.read(path, None))
+            search = SearchIndex(buffer)
+            history = History(buffer)
+            resumed = history.load(path + ".undo")
+            first_line = len(buffer) == 0
+            match = -1
+            print(f"opened {path}" + (" with undo history" if resumed else ""))
+        elif text_input in ("[undo]", "[redo]"):
+            done = history.undo() if text_input == "[undo]" else history.redo()
+            if not done:
+                print("nothing to " + text_input[1:-1])
+            first_line = len(buffer) == 0
+            match = -1
+        elif text_input.startswith("[find ") and text_input.endswith("]"):
+            pattern = text_input[len("[find "):-1]
+            match = _show_match(buffer, search.find(pattern))
+        elif text_input == "[next]":
+            match = _show_match(buffer, search.find(pattern, match + 1) if match != -1 else -1)
+        elif text_input.startswith("[replace ") and " -> " in text_input and text_input.endswith("]"):
+            old, _, new = text_input[len("[replace "):-1].partition(" -> ")
+            with history.group():
+                count = search.replace_all(old, new)
+            print(f"replaced {count} occurrence(s)")
+            match = -1
+        elif first_line:
+            buffer.append(text_input)
+            first_line = False
+        else:
+            buffer.append("\n" + text_input)
+    return str(buffer)
+
+
+def _show_match(buffer, pos):
+    if pos == -1:
+        print("not found")
+        return -1
+    line = buffer.line_of(pos)
+    print(f"{line + 1}: {buffer.line(line)}")
+    return pos
+
+
+def open_main():
+    """
+    Page through a (possibly huge) file without loading it.
+
+    Commands:
+      (enter)          next page
+      [up]             previous page
+      [goto N]         jump to line N
+      [edit N] text    replace line N
+      [delete N]       delete line N
+      [save]           write the edits back
+      [exit]           leave
+    """
+    print("enter file path:")
+    path = input("open> ")
+    try:
+        doc = MappedFile(path)
+    except OSError:
+        print("could not open file")
+        return
+
+    height = max(5, shutil.get_terminal_size((80, 24)).lines - 3)
+    first = 0
+    try:
+        while True:
+            for n, text in doc.window(first, height):
+                print(f"{n + 1:>6} {text}")
+            total = doc.line_count(wait=False)
+            where = f"{total} lines" if total is not None else f"indexing {doc.indexed_fraction():.0%}"
+            command = input(f"[{path}: {where}{', modified' if doc.modified() else ''}] ")
+
+            if command == "[exit]":
+                break
+            elif command == "":
+                first += height
+            elif command == "[up]":
+                first = max(0, first - height)
+            elif command == "[save]":
+                try:
+                    doc.save()
+                    print("saved")
+                except OSError as e:
+                    print(f"could not save: {e}")
+            else:
+                name, _, rest = command.partition("]")
+                name, _, number = name.partition(" ")
+                try:
+                    n = int(number) - 1
+                    if name == "[goto":
+                        first = max(0, n)
+                    elif name == "[edit":
+                        doc.set_line(n, rest.lstrip(" "))
+                    elif name == "[delete":
+                        doc.delete_line(n)
+                    else:
+                        print("unknown command")
+                except (ValueError, IndexError):
+                    print("no such line")
+    finally:
+        doc.close()
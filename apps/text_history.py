@@ -0,0 +1,183 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from utils import data
+
+_FORMAT = "tbos-undo 1"
+
+
+class History:
+    """
+    Undo/redo for a PieceTable, stored as deltas rather than snapshots.
+
+    Every edit the buffer reports becomes an op [pos, removed, inserted]
+    where removed/inserted are lists of the strings involved - references
+    to what the buffer already holds, not copies of the document. Typing
+    that continues where the previous insert stopped (or backspacing over
+    what was just deleted) within `coalesce_window` seconds extends the
+    previous op instead of adding one. Ops made inside group() undo
+    together. Once the deltas exceed `max_chars` the oldest are dropped, so
+    history memory tracks the size of the edits, not of the document.
+    """
+
+    def __init__(self, buffer, max_chars=1024 * 1024, coalesce_window=1.0, clock=time.monotonic):
+        self.buffer = buffer
+        self.max_chars = max_chars
+        self.coalesce_window = coalesce_window
+        self.clock = clock
+        self._undo = deque()  # entries: list of ops; op = [pos, removed, inserted, removed_len, inserted_len]
+        self._redo = []
+        self._chars = 0
+        self._last_time = None
+        self._group = None
+        self._applying = False
+        buffer.listeners.append(self._record)
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def memory_chars(self):
+        """Characters held by the undo and redo deltas."""
+        return self._chars
+
+    @contextmanager
+    def group(self):
+        """Record every edit made inside the block as one undo step."""
+        outer = self._group is None
+        if outer:
+            self._group = []
+        try:
+            yield
+        finally:
+            if outer:
+                ops, self._group = self._group, None
+                if ops:
+                    self._push_entry(ops)
+                self._last_time = None
+
+    # -- recording -------------------------------------------------------------
+    def _record(self, pos, removed, inserted):
+        if self._applying:
+            return
+        self._drop_redo()
+        if self._group is not None:
+            self._group.append(self._op(pos, removed, inserted))
+            return
+
+        now = self.clock()
+        last = self._undo[-1] if self._undo else None
+        if (last is not None and len(last) == 1 and self._last_time is not None
+                and now - self._last_time <= self.coalesce_window and self._coalesce(last[0], pos, removed, inserted)):
+            self._chars += len(removed) + len(inserted)
+        else:
+            self._push_entry([self._op(pos, removed, inserted)])
+        self._last_time = now
+        self._trim()
+
+    @staticmethod
+    def _op(pos, removed, inserted):
+        return [pos, [removed] if removed else [], [inserted] if inserted else [], len(removed), len(inserted)]
+
+    @staticmethod
+    def _coalesce(op, pos, removed, inserted):
+        o_pos, o_removed, o_inserted, o_rlen, o_ilen = op
+        if inserted and not removed and not o_rlen and pos == o_pos + o_ilen:
+            o_inserted.append(inserted)  # kept typing
+            op[4] += len(inserted)
+            return True
+        if removed and not inserted and not o_ilen:
+            if pos + len(removed) == o_pos:  # backspace
+                o_removed.insert(0, removed)
+                op[0] = pos
+                op[3] += len(removed)
+                return True
+            if pos == o_pos:  # forward delete
+                o_removed.append(removed)
+                op[3] += len(removed)
+                return True
+        return False
+
+    def _push_entry(self, ops):
+        self._undo.append(ops)
+        self._chars += sum(op[3] + op[4] for op in ops)
+        self._trim()
+
+    def _trim(self):
+        while self._chars > self.max_chars and len(self._undo) > 1:
+            self._chars -= sum(op[3] + op[4] for op in self._undo.popleft())
+
+    def _drop_redo(self):
+        for ops in self._redo:
+            self._chars -= sum(op[3] + op[4] for op in ops)
+        self._redo.clear()
+
+    # -- undo/redo -------------------------------------------------------------
+    def undo(self):
+        """Revert the newest step. Returns False when there is nothing to undo."""
+        if not self._undo:
+            return False
+        ops = self._undo.pop()
+        self._applying = True
+        try:
+            for pos, removed, _inserted, _rlen, ilen in reversed(ops):
+                self.buffer.replace(pos, ilen, "".join(removed))
+        finally:
+            self._applying = False
+        self._redo.append(ops)
+        self._last_time = None
+        return True
+
+    def redo(self):
+        if not self._redo:
+            return False
+        ops = self._redo.pop()
+        self._applying = True
+        try:
+            for pos, _removed, inserted, rlen, _ilen in ops:
+                self.buffer.replace(pos, rlen, "".join(inserted))
+        finally:
+            self._applying = False
+        self._undo.append(ops)
+        self._last_time = None
+        return True
+
+    # -- persistence -----------------------------------------------------------
+    def save(self, file_path):
+        """Write the history as JSON lines; load() restores it for the same document."""
+        lines = [json.dumps({"format": _FORMAT, "length": len(self.buffer)})]
+        for stack, ops_list in (("u", self._undo), ("r", self._redo)):
+            for ops in ops_list:
+                lines.append(json.dumps([stack, [[op[0], "".join(op[1]), "".join(op[2])] for op in ops]]))
+        data.writeChunks(file_path, (line + "\n" for line in lines))
+
+    def load(self, file_path):
+        """
+        Restore a history saved with save(). Returns False (and keeps the
+        current history) if the file is missing or was saved for a document
+        of a different length.
+        """
+        if not data.getFileExists(file_path):
+            return False
+        lines = data.read(file_path, None).splitlines()
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            return False
+        if header.get("format") != _FORMAT or header.get("length") != len(self.buffer):
+            return False
+
+        self._undo.clear()
+        self._redo.clear()
+        self._chars = 0
+        for line in lines[1:]:
+            stack, raw_ops = json.loads(line)
+            ops = [self._op(pos, removed, inserted) for pos, removed, inserted in raw_ops]
+            (self._undo if stack == "u" else self._redo).append(ops)
+            self._chars += sum(op[3] + op[4] for op in ops)
+        self._last_time = None
+        return True
@@ -0,0 +1,158 @@
+from bisect import bisect_right
+
+_CHUNK_LINES = 64
+
+
+class SearchIndex:
+    """
+    Trigram index over a PieceTable, kept up to date as the buffer changes.
+
+    The document is cut into chunks of about _CHUNK_LINES lines and each
+    chunk remembers the set of 3-character sequences found in its lines.
+    A query only scans the chunks whose set holds every trigram of the
+    pattern, so repeated searches of a large buffer skip most of it. Edits
+    reported by the buffer resize the chunk they land in and mark it for
+    re-indexing on the next query; nothing is rebuilt eagerly.
+
+    Matches are found within a line; patterns containing a newline fall
+    back to a plain scan of the document.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.chunks_scanned = 0
+        self._chunks = None   # [line count, trigram set or None]; built on first query
+        self._starts = []     # first line of each chunk
+        self._valid = 0       # _starts is correct for chunks < _valid
+        buffer.listeners.append(self._edited)
+
+    # -- queries ---------------------------------------------------------------
+    def find(self, pattern, start=0):
+        """Position of the first match at or after `start`, or -1."""
+        if not pattern:
+            return -1
+        if "\n" in pattern:
+            return str(self.buffer).find(pattern, start)
+
+        self._build()
+        start = max(0, start)
+        if start > len(self.buffer):
+            return -1
+        c = self._chunk_of(self.buffer.line_of(start))
+        for k in range(c, len(self._chunks)):
+            hit = self._find_in_chunk(k, pattern, start)
+            if hit != -1:
+                return hit
+        return -1
+
+    def find_all(self, pattern):
+        """Every match position, in order (non-overlapping)."""
+        hits = []
+        pos = self.find(pattern)
+        while pos != -1:
+            hits.append(pos)
+            pos = self.find(pattern, pos + len(pattern))
+        return hits
+
+    def replace_all(self, old, new):
+        """Replace every occurrence of old with new; returns the number replaced."""
+        if not old:
+            return 0
+        if "\n" in old:
+            text = str(self.buffer)
+            count = text.count(old)
+            if count:
+                self.buffer.replace(0, len(text), text.replace(old, new))
+            return count
+
+        self._build()
+        count = 0
+        # one pass over candidate chunks, from the end so earlier offsets stay put
+        for k in range(len(self._chunks) - 1, -1, -1):
+            if not self._may_contain(k, old):
+                continue
+            start, end = self._chunk_span(k)
+            text = self.buffer.get_text(start, end)
+            n = text.count(old)
+            if n:
+                self.buffer.replace(start, end - start, text.replace(old, new))
+                count += n
+        return count
+
+    # -- internals -------------------------------------------------------------
+    def _find_in_chunk(self, k, pattern, start):
+        if not self._may_contain(k, pattern):
+            return -1
+        chunk_start, chunk_end = self._chunk_span(k)
+        if chunk_end < start:
+            return -1
+        text = self.buffer.get_text(chunk_start, chunk_end)
+        i = text.find(pattern, max(0, start - chunk_start))
+        return -1 if i == -1 else chunk_start + i
+
+    def _may_contain(self, k, pattern):
+        grams = self._grams(k)
+        if len(pattern) < 3:
+            return True
+        return all(gram in grams for gram in zip(pattern, pattern[1:], pattern[2:]))
+
+    def _grams(self, k):
+        chunk = self._chunks[k]
+        if chunk[1] is None:
+            start, end = self._chunk_span(k)
+            text = self.buffer.get_text(start, end)
+            chunk[1] = set(zip(text, text[1:], text[2:]))
+            self.chunks_scanned += 1
+        return chunk[1]
+
+    def _chunk_span(self, k):
+        """Character range [start, end) of chunk k, without the newline that ends it."""
+        self._refresh()
+        first = self._starts[k]
+        last = first + self._chunks[k][0]
+        buffer = self.buffer
+        start = buffer.line_start(first)
+        end = buffer.line_start(last) - 1 if last <= buffer.line_count() - 1 else len(buffer)
+        return start, end
+
+    def _build(self):
+        if self._chunks is not None:
+            return
+        lines = self.buffer.line_count()
+        self._chunks = [[min(_CHUNK_LINES, lines - first), None] for first in range(0, lines, _CHUNK_LINES)]
+        self._valid = 0
+        self._refresh()
+
+    def _refresh(self):
+        chunks = self._chunks
+        if self._valid >= len(chunks) and len(self._starts) == len(chunks):
+            return
+        starts = self._starts
+        del starts[self._valid:]
+        if not starts:
+            starts.append(0)
+        for k in range(len(starts), len(chunks)):
+            starts.append(starts[k - 1] + chunks[k - 1][0])
+        self._valid = len(chunks)
+
+    def _chunk_of(self, line):
+        self._refresh()
+        return max(0, bisect_right(self._starts, line, 0, len(self._chunks)) - 1)
+
+    def _edited(self, pos, removed, inserted):
+        if self._chunks is None:
+            return  # nothing indexed yet
+        first = self.buffer.line_of(pos)
+        old_lines = 1 + removed.count("\n")
+        new_lines = 1 + inserted.count("\n")
+        c = self._chunk_of(first)
+        # merge the chunks the old lines spanned into one re-indexed chunk
+        end = c
+        covered = self._starts[c] + self._chunks[c][0]
+        while covered < first + old_lines and end + 1 < len(self._chunks):
+            end += 1
+            covered += self._chunks[end][0]
+        lines = sum(chunk[0] for chunk in self._chunks[c:end + 1]) - old_lines + new_lines
+        pieces = [[min(_CHUNK_LINES, lines - i), None] for i in range(0, lines, _CHUNK_LINES)]
+        self._chunks[c:end + 1] = pieces
+        self._valid = min(self._valid, c + 1)
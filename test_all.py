@@ -2,10 +2,24 @@
 """
 Single-file test runner for:
 - text_editor.py
+- text_buffer.py
+- text_search.py
+- text_history.py
 - image.py
 - screensaver.py
 - snake.py
 - tetris.py
+- registry.py
+- boot.py
+- installed.py
+- data.py
+- filecache.py
+- journal.py
+- vfs.py
+- rendercache.py
+- terminal.py
+- frames.py
+- keyboard.py
 
 Run:
   python test_all.py
@@ -20,29 +34,36 @@ import time
 import types
 import struct
 import zlib
+import asyncio
+import tempfile
 import unittest
 from contextlib import redirect_stdout
 from unittest.mock import patch
 
 
-# ---------------------------------------------------------------------------
-# Compatibility: provide a dummy msvcrt on non-Windows so snake/tetris import.
-# ---------------------------------------------------------------------------
-if "msvcrt" not in sys.modules:
-    dummy = types.ModuleType("msvcrt")
-    dummy.kbhit = lambda: False
-    dummy.getch = lambda: b""
-    sys.modules["msvcrt"] = dummy
-
-
 # ---------------------------------------------------------------------------
 # Import modules under test
 # ---------------------------------------------------------------------------
 from apps import text_editor
+from apps.text_buffer import MappedFile, PieceTable
+from apps.text_search import SearchIndex
+from apps.text_history import History
 from apps import image
 from apps import screensaver
 from apps import snake
 from apps import tetris
+from apps import registry
+from utils import boot
+from utils import data
+from utils.installed import InstalledApps
+from utils.filecache import FileCache
+from utils.journal import WriteJournal
+from utils.vfs import PackFile
+from utils.rendercache import DiskCache, LRUCache
+from utils import terminal
+from utils.terminal import FrameBuffer
+from utils.frames import FrameClock, FrameStats
+from utils.keyboard import Keyboard, KeyDecoder, KeyEvent, _ConsoleSource, _TerminalSource
 
 
 # ---------------------------------------------------------------------------
@@ -87,11 +108,51 @@ class _ResultCatchingRunner(unittest.TextTestRunner):
         return result
 
 
+def _isolate_data_layers():
+    """
+    Turn utils.data's cache and write-behind journal off for a test and
+    return a function that puts back whatever was on before (the shell's
+    `test` command runs this suite with both enabled).
+    """
+    saved = (data._cache, data._journal)
+    data._cache = data._journal = None
+
+    def restore():
+        data.disableWriteBehind()
+        data.disableCache()
+        data._cache, data._journal = saved
+
+    return restore
+
+
+class _ScriptedKeyboard:
+    """Stands in for the Keyboard class: each events() call hands out the next tick's keys."""
+
+    def __init__(self, ticks):
+        self.ticks = list(ticks)
+
+    def __call__(self):
+        return self
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+    def pending(self):
+        return bool(self.ticks and self.ticks[0])
+
+    def events(self):
+        keys = self.ticks.pop(0) if self.ticks else []
+        return [KeyEvent(key, 0.0) for key in keys]
+
+
 # ---------------------------------------------------------------------------
 # Tests
 # ---------------------------------------------------------------------------
 class TestTextEditor(unittest.TestCase):
-    def test_text_editor_concatenates_until_exit(self):
+    def test_text_editor_joins_lines_until_exit(self):
         inputs = iter(["hello", " ", "world", "[exit]"])
 
         def fake_input(_prompt=""):
@@ -100,7 +161,305 @@ class TestTextEditor(unittest.TestCase):
         with patch("builtins.input", side_effect=fake_input):
             out = text_editor.main()
 
-        self.assertEqual(out, "hello world")
+        self.assertEqual(out, "hello\n \nworld")
+
+    def test_text_editor_save_streams_to_disk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "doc.txt")
+            inputs = iter(["", "line two", f"[save {path}]", "[exit]"])
+            with patch("builtins.input", side_effect=lambda _p="": next(inputs)), redirect_stdout(io.StringIO()):
+                out = text_editor.main()
+            with open(path) as f:
+                self.assertEqual(f.read(), out)
+        self.assertEqual(out, "\nline two")
+
+
+class TestSearchIndex(unittest.TestCase):
+    def _buffer(self):
+        return PieceTable("".join(f"row {i} {'needle' if i % 250 == 7 else 'hay'}\n" for i in range(1000)))
+
+    def test_find_skips_chunks_without_pattern(self):
+        buf = self._buffer()
+        index = SearchIndex(buf)
+        text = str(buf)
+        self.assertEqual(index.find("needle"), text.find("needle"))
+        expected = [i for i in range(len(text)) if text.startswith("needle", i)]
+        self.assertEqual(index.find_all("needle"), expected)
+        scanned = index.chunks_scanned
+        self.assertEqual(index.find_all("needle"), expected)
+        self.assertEqual(index.chunks_scanned, scanned)  # no re-indexing for repeat queries
+        self.assertEqual(index.find("missing"), -1)
+
+    def test_index_follows_edits(self):
+        buf = self._buffer()
+        index = SearchIndex(buf)
+        self.assertEqual(len(index.find_all("needle")), 4)
+        pos = buf.line_start(500)
+        buf.insert(pos, "fresh needle\nand more\n")
+        buf.delete(buf.line_start(7), 4)
+        text = str(buf)
+        self.assertEqual(index.find_all("needle"), [i for i in range(len(text)) if text.startswith("needle", i)])
+        self.assertEqual(index.find("fresh"), text.find("fresh"))
+
+    def test_replace_all_matches_str_replace(self):
+        buf = self._buffer()
+        expected = str(buf).replace("hay", "straw")
+        index = SearchIndex(buf)
+        self.assertEqual(index.replace_all("hay", "straw"), 996)
+        self.assertEqual(str(buf), expected)
+        self.assertEqual(index.find("hay"), -1)
+        self.assertEqual(index.replace_all("0 straw\nrow", "X"), expected.count("0 straw\nrow"))
+
+    def test_editor_find_next_replace(self):
+        inputs = iter(["a cat", "dog", "cat again", "[find cat]", "[next]", "[next]",
+                       "[replace cat -> bird]", "[exit]"])
+        buf = io.StringIO()
+        with patch("builtins.input", side_effect=lambda _p="": next(inputs)), redirect_stdout(buf):
+            out = text_editor.main()
+        self.assertEqual(buf.getvalue().splitlines()[:4], ["1: a cat", "3: cat again", "not found", "replaced 2 occurrence(s)"])
+        self.assertEqual(out, "a bird\ndog\nbird again")
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.restore_data = _isolate_data_layers()
+
+    def tearDown(self):
+        self.restore_data()
+
+    def _history(self, buffer, **kwargs):
+        return History(buffer, clock=lambda: self.now, **kwargs)
+
+    def test_keystrokes_coalesce_and_undo_redo_roundtrip(self):
+        buf = PieceTable("x")
+        history = self._history(buf)
+        for ch in "abc":
+            buf.append(ch)
+        self.now = 5.0
+        buf.delete(0, 1)
+        self.assertEqual(str(buf), "abc")
+
+        self.assertTrue(history.undo())
+        self.assertEqual(str(buf), "xabc")
+        self.assertTrue(history.undo())  # "abc" was typed as one burst
+        self.assertEqual(str(buf), "x")
+        self.assertFalse(history.undo())
+        history.redo()
+        history.redo()
+        self.assertEqual(str(buf), "abc")
+        buf.append("!")
+        self.assertFalse(history.redo())
+
+    def test_memory_cap_drops_oldest_deltas(self):
+        buf = PieceTable("big document " * 10000)
+        history = self._history(buf, max_chars=100, coalesce_window=0)
+        for i in range(50):
+            self.now += 1
+            buf.insert(0, "0123456789")
+        self.assertLessEqual(history.memory_chars(), 100)
+        undone = 0
+        while history.undo():
+            undone += 1
+        self.assertEqual(undone, 10)
+
+    def test_group_and_persist(self):
+        buf = PieceTable("one two one")
+        history = self._history(buf)
+        with history.group():
+            SearchIndex(buf).replace_all("one", "1")
+        buf.append(" three")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "doc.undo")
+            history.save(path)
+            resumed_buf = PieceTable(str(buf))
+            resumed = self._history(resumed_buf)
+            self.assertTrue(resumed.load(path))
+            self.assertFalse(self._history(PieceTable("other")).load(path))
+        resumed.undo()
+        self.assertEqual(str(resumed_buf), "1 two 1")
+        resumed.undo()
+        self.assertEqual(str(resumed_buf), "one two one")
+
+    def test_editor_undo_redo_commands(self):
+        inputs = iter(["first", "second", "[undo]", "[undo]", "[redo]", "[exit]"])
+        buf = io.StringIO()
+        with patch("builtins.input", side_effect=lambda _p="": next(inputs)), redirect_stdout(buf):
+            out = text_editor.main()
+        # the two lines were typed in one burst, so they undo together
+        self.assertIn("nothing to undo", buf.getvalue())
+        self.assertEqual(out, "first\nsecond")
+
+
+class TestMappedFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "big.log")
+        with open(self.path, "w") as f:
+            f.write("".join(f"entry {i}\n" for i in range(1000)))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_window_reads_lines_across_checkpoints(self):
+        doc = MappedFile(self.path)
+        try:
+            self.assertEqual(doc.line_count(), 1000)
+            self.assertEqual(doc.window(130, 2), [(130, "entry 130"), (131, "entry 131")])
+            self.assertEqual(doc.window(998, 5), [(998, "entry 998"), (999, "entry 999")])
+            with self.assertRaises(IndexError):
+                doc.raw_line(1000)
+        finally:
+            doc.close()
+
+    def test_overlay_edits_merged_on_save(self):
+        doc = MappedFile(self.path)
+        doc.set_line(0, "first\nsplit")
+        doc.delete_line(500)
+        doc.set_line(999, "last")
+        doc.save()
+        try:
+            self.assertFalse(doc.modified())
+            self.assertEqual(doc.line_count(), 1000)
+        finally:
+            doc.close()
+        with open(self.path) as f:
+            lines = f.read().split("\n")
+        self.assertEqual(lines[:3], ["first", "split", "entry 1"])
+        self.assertNotIn("entry 500", lines)
+        self.assertEqual(lines[-2:], ["last", ""])
+
+    def test_save_under_write_behind_streams_bytes_and_reopens_new_file(self):
+        restore_data = _isolate_data_layers()
+        try:
+            data.enableWriteBehind(os.path.join(self.tmp.name, ".journal"), max_delay=60)
+            # newer content still in the journal is what gets mapped
+            data.write(self.path, "".join(f"caf\u00e9 {i}\n" for i in range(200)))
+            doc = MappedFile(self.path)
+            try:
+                self.assertEqual(doc.raw_line(199), "caf\u00e9 199")
+            finally:
+                doc.close()
+
+            with open(self.path, "ab") as f:
+                f.write(b"latin \xe9\n")  # not UTF-8
+            with open(self.path, "rb") as f:
+                original = f.read()
+            with patch("apps.text_buffer._SCAN_STEP", 3):  # chunks split the multibyte characters
+                doc = MappedFile(self.path)
+                doc.set_line(1, "edited")
+                doc.save()
+            try:
+                self.assertFalse(doc.modified())
+                self.assertEqual(doc.raw_line(1), "edited")
+                self.assertEqual(doc.raw_line(2), "caf\u00e9 2")
+            finally:
+                doc.close()
+            data.disableWriteBehind()  # a checkpoint must not bring an older copy back
+            with open(self.path, "rb") as f:
+                saved = f.read()
+        finally:
+            restore_data()
+        self.assertEqual(saved, original.replace("caf\u00e9 1\n".encode("utf-8"), b"edited\n", 1))
+        self.assertTrue(saved.endswith(b"latin \xe9\n"))
+
+    def test_save_closes_the_map_before_replacing_the_file(self):
+        doc = MappedFile(self.path)
+        doc.set_line(0, "changed")
+        real_replace = os.replace
+
+        def windows_replace(src, dst):
+            if not doc._f.closed:
+                raise PermissionError(13, "file is in use", dst)
+            real_replace(src, dst)
+
+        with patch("utils.data.os.replace", windows_replace):
+            doc.save()
+        try:
+            self.assertEqual(doc.raw_line(0), "changed")
+        finally:
+            doc.close()
+
+    def test_open_main_reports_a_refused_save_and_keeps_the_edits(self):
+        inputs = iter([self.path, "[edit 1] changed", "[save]", "[exit]"])
+        buf = io.StringIO()
+        refuse = patch("utils.data.os.replace", side_effect=PermissionError(13, "file is in use"))
+        with patch("builtins.input", side_effect=lambda _p="": next(inputs)), redirect_stdout(buf), refuse, \
+             patch("shutil.get_terminal_size", return_value=os.terminal_size((80, 13))):
+            text_editor.open_main()
+        out = buf.getvalue()
+        self.assertIn("could not save", out)
+        self.assertIn("     1 changed", out.split("could not save")[1])  # still shown after the refusal
+        self.assertEqual(os.listdir(self.tmp.name), ["big.log"])
+        with open(self.path) as f:
+            self.assertEqual(f.readline(), "entry 0\n")
+
+    def test_open_main_pages_and_exits(self):
+        inputs = iter([self.path, "", "[goto 900]", "[edit 900] changed", "[exit]"])
+        buf = io.StringIO()
+        with patch("builtins.input", side_effect=lambda _p="": next(inputs)), redirect_stdout(buf), \
+             patch("shutil.get_terminal_size", return_value=os.terminal_size((80, 13))):
+            text_editor.open_main()
+        out = buf.getvalue()
+        self.assertIn("   900 entry 899", out)
+        self.assertIn("   900 changed", out)
+
+
+class TestPieceTable(unittest.TestCase):
+    def test_insert_delete_match_plain_string(self):
+        import random as _random
+        rng = _random.Random(7)
+        buf = PieceTable("start\n")
+        ref = "start\n"
+        for _ in range(2000):
+            if ref and rng.random() < 0.4:
+                pos = rng.randrange(len(ref))
+                n = min(rng.randint(1, 8), len(ref) - pos)
+                self.assertEqual(buf.delete(pos, n), ref[pos:pos + n])
+                ref = ref[:pos] + ref[pos + n:]
+            else:
+                pos = rng.randint(0, len(ref))
+                text = rng.choice(["a", "bc\n", "\n", "xyz"])
+                buf.insert(pos, text)
+                ref = ref[:pos] + text + ref[pos:]
+        self.assertEqual(str(buf), ref)
+        self.assertEqual(len(buf), len(ref))
+        lines = ref.split("\n")
+        self.assertEqual(buf.line_count(), len(lines))
+        for n in (0, len(lines) // 2, len(lines) - 1):
+            self.assertEqual(buf.line(n), lines[n])
+        self.assertEqual(buf.get_text(5, 40), ref[5:40])
+
+    def test_many_appends_stay_line_addressable(self):
+        buf = PieceTable()
+        for i in range(5000):
+            buf.append(f"line {i}\n")
+        self.assertEqual(buf.line(4321), "line 4321")
+        self.assertEqual(list(buf.iter_lines(10, 2)), ["line 10", "line 11"])
+
+    def test_edits_update_block_sums_in_place(self):
+        buf = PieceTable()
+        for i in range(5000):
+            buf.append(f"line {i}\n")
+        self.assertGreater(len(buf._blocks), 3)
+        buf.line(1)
+        sums = buf._char_sums
+        buf.insert(3, "ab\ncd")
+        buf.delete(20, 7)
+        self.assertIs(buf._char_sums, sums)  # no rebuild of the later blocks' sums
+        ref = str(buf)
+        self.assertEqual(buf.line(4000), ref.split("\n")[4000])
+        self.assertEqual(buf.line_of(buf.line_start(4000)), 4000)
+
+        # emptying whole blocks drops them and rebuilds the sums
+        start, end = buf.line_start(1000), buf.line_start(3000)
+        buf.delete(start, end - start)
+        ref = ref[:start] + ref[end:]
+        self.assertIsNone(buf._char_sums)
+        lines = ref.split("\n")
+        for n in (999, 1000, 1001, len(lines) - 1):
+            self.assertEqual(buf.line(n), lines[n])
+        self.assertEqual(buf.line_of(start), 1000)
 
 
 class TestImageModule(unittest.TestCase):
@@ -117,6 +476,13 @@ class TestImageModule(unittest.TestCase):
         code = image._gray_to_ansi256(128)
         self.assertTrue(232 <= code <= 255)
 
+    def test_gray_code_table_matches_function(self):
+        self.assertEqual(list(image._GRAY_CODES), [image._gray_to_ansi256(g) for g in range(256)])
+
+    def test_halfblock_line_emits_escapes_only_on_change(self):
+        line = image._halfblock_line(bytes([232, 232, 240, 240]), bytes([232, 232, 232, 250]))
+        self.assertEqual(line, "\x1b[38;5;232m\x1b[48;5;232m▀▀\x1b[38;5;240m▀\x1b[48;5;250m▀\x1b[0m")
+
     def test_nearest_resize_identity(self):
         src = bytes([1, 2, 3, 4])  # 2x2, bpp=1
         out = image._nearest_resize(2, 2, src, 1, 2, 2)
@@ -174,6 +540,37 @@ class TestImageModule(unittest.TestCase):
         out = image._unfilter(raw, width=3, height=2, bpp=1)
         self.assertEqual(list(out), [10,10,10, 11,12,13])
 
+    def test_gray_plane_composites_alpha(self):
+        # RGBA: opaque white, transparent, half-transparent red over bg 100
+        pix = bytes([255, 255, 255, 255, 9, 9, 9, 0, 255, 0, 0, 128])
+        self.assertEqual(list(image._gray_plane(pix, 3, 1, 6, 100)), [255, 100, (76 * 128 + 100 * 127) // 255])
+        self.assertEqual(list(image._gray_plane(bytes([10, 255, 10, 0]), 2, 1, 4, 50)), [10, 50])
+
+    def test_set_backend_rejects_unknown(self):
+        with self.assertRaises(ValueError):
+            image.set_backend("gpu")
+
+    @unittest.skipIf(image.np is None, "numpy not installed")
+    def test_numpy_backend_matches_python(self):
+        import random as _random
+        rng = _random.Random(3)
+        for bpp, ctype in ((1, 0), (2, 4), (3, 2), (4, 6)):
+            w, h = 17, 9
+            raw = bytearray()
+            for _ in range(h):
+                raw.append(rng.randrange(5))
+                raw.extend(rng.randrange(256) for _ in range(w * bpp))
+            previous = image.get_backend()
+            try:
+                image.set_backend("python")
+                expected = image._unfilter(bytes(raw), w, h, bpp)
+                gray = image._gray_plane(expected, w, h, ctype, 40)
+                image.set_backend("numpy")
+                self.assertEqual(image._unfilter(bytes(raw), w, h, bpp), expected)
+                self.assertEqual(image._gray_plane(expected, w, h, ctype, 40), gray)
+            finally:
+                image.set_backend(previous)
+
     def test_read_png_and_display_runs(self):
         # Create a tiny 2x2 grayscale PNG on disk and ensure decoder works,
         # and display function prints something.
@@ -203,59 +600,286 @@ class TestImageModule(unittest.TestCase):
             except OSError:
                 pass
 
+    def test_stream_rows_match_whole_decode_across_idat_chunks(self):
+        import random as _random
+        rng = _random.Random(5)
+        w, h, bpp = 13, 11, 3
+        raw = bytearray()
+        for _ in range(h):
+            raw.append(rng.randrange(5))
+            raw.extend(rng.randrange(256) for _ in range(w * bpp))
+        expected = image._unfilter(bytes(raw), w, h, bpp)
+
+        # split the zlib stream over several small IDAT chunks
+        comp = zlib.compress(bytes(raw))
+        png = _make_png_bytes(1, 1, 0, b"\x00")
+        ihdr = struct.pack(">I", 13) + b"IHDR" + struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0) + b"\x00" * 4
+        idats = b"".join(struct.pack(">I", len(comp[i:i + 7])) + b"IDAT" + comp[i:i + 7] + b"\x00" * 4
+                         for i in range(0, len(comp), 7))
+        iend = png[-12:]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "rows.png")
+            with open(path, "wb") as f:
+                f.write(png[:8] + ihdr + idats + iend)
+            with patch.object(image, "_INFLATE_STEP", 10):
+                with image._PngStream(path) as stream:
+                    rows = [bytes(row) for row in stream.rows()]
+                self.assertEqual(b"".join(rows), bytes(expected))
+                self.assertEqual(bytes(image._read_png_8bit_noninterlaced(path)[3]), bytes(expected))
+
+    def test_stream_rejects_truncated_data(self):
+        png = _make_png_bytes(4, 4, 0, bytes(16))
+        ihdr_end = 8 + 25
+        short = zlib.compress(bytes(5 * 3))  # three of the four rows
+        idat = struct.pack(">I", len(short)) + b"IDAT" + short + b"\x00" * 4
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "short.png")
+            with open(path, "wb") as f:
+                f.write(png[:ihdr_end] + idat + png[-12:])
+            with self.assertRaises(ValueError):
+                image._read_png_8bit_noninterlaced(path)
+
+    def test_pipelined_stream_matches_inline_and_stops_its_thread(self):
+        import threading as _threading
+        pixels = bytes((x * 7 + y * 13) & 0xFF for y in range(40) for x in range(30 * 3))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "pipe.png")
+            with open(path, "wb") as f:
+                f.write(_make_png_bytes(30, 40, 2, pixels, filter_type=2))
+            with patch.object(image, "_INFLATE_STEP", 64), patch.object(image, "_PIPELINE_DEPTH", 2):
+                with image._PngStream(path, pipelined=False) as stream:
+                    expected = b"".join(stream.rows())
+                with image._PngStream(path, pipelined=True) as stream:
+                    self.assertEqual(b"".join(stream.rows()), expected)
+                with image._PngStream(path, pipelined=True) as stream:
+                    first = next(stream.sampled_rows([1]))
+                self.assertEqual(first[1], expected[90:180])
+            self.assertFalse(any(t.name == "png-inflate" for t in _threading.enumerate()))
+
+            with open(path, "wb") as f:
+                f.write(_make_png_bytes(30, 40, 2, pixels)[:-40] + b"\x00" * 12)  # cut into the zlib stream
+            with self.assertRaises(Exception):
+                with image._PngStream(path, pipelined=True) as stream:
+                    for _row in stream.rows():
+                        pass
+
+    def test_nearest_resize_rows_streams_output(self):
+        src = bytes(range(16))  # 4x4, bpp=1
+        rows = ((y, src[y * 4:(y + 1) * 4]) for y in (0, 2))  # only the sampled rows
+        self.assertEqual([bytes(r) for r in image._nearest_resize_rows(rows, 4, 4, 1, 2, 2)],
+                         [bytes([0, 2]), bytes([8, 10])])
+        self.assertEqual(bytes(image._nearest_resize(4, 4, src, 1, 2, 3)), bytes([0, 2, 4, 6, 8, 10]))
+
+    def test_sampled_rows_skips_rows_nothing_depends_on(self):
+        import random as _random
+        rng = _random.Random(8)
+        w, h = 9, 40
+        raw = bytearray()
+        for y in range(h):
+            raw.append(rng.choice((0, 1, 2, 2, 3, 4)))
+            raw.extend(rng.randrange(256) for _ in range(w))
+        full = image._unfilter(bytes(raw), w, h, 1)
+        comp = zlib.compress(bytes(raw))
+        png = _make_png_bytes(1, 1, 0, b"\x00")
+        ihdr = struct.pack(">I", 13) + b"IHDR" + struct.pack(">IIBBBBB", w, h, 8, 0, 0, 0, 0) + b"\x00" * 4
+        idat = struct.pack(">I", len(comp)) + b"IDAT" + comp + b"\x00" * 4
+
+        calls = []
+        real = image._unfilter_row
+
+        def counting(ftype, row, prev, bpp):
+            calls.append(ftype)
+            return real(ftype, row, prev, bpp)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sampled.png")
+            with open(path, "wb") as f:
+                f.write(png[:8] + ihdr + idat + png[-12:])
+            wanted = [3, 17, 18, 30]
+            with patch.object(image, "_unfilter_row", counting):
+                with image._PngStream(path) as stream:
+                    got = list(stream.sampled_rows(wanted))
+        self.assertEqual([y for y, _row in got], wanted)
+        for y, row in got:
+            self.assertEqual(bytes(row), bytes(full[y * w:(y + 1) * w]))
+        self.assertLess(len(calls), 31)  # rows after 30 and dropped chains are never unfiltered
+
+    def test_box_resize_averages_blocks(self):
+        src = bytes([0, 10, 20, 30,
+                     40, 50, 60, 70])  # 4x2, bpp=1
+        rows = ((y, src[y * 4:(y + 1) * 4]) for y in range(2))
+        self.assertEqual([list(r) for r in image._box_resize_rows(rows, 4, 2, 1, 2, 1)], [[25, 45]])
+
+        rgba = bytes([0, 0, 0, 255, 255, 255, 255, 255])  # 2x1, two RGBA pixels
+        self.assertEqual(list(next(image._box_resize_rows([(0, rgba)], 2, 1, 4, 1, 1))), [127, 127, 127, 255])
+
+    def test_render_reuses_caches(self):
+        pixels = bytes(range(0, 256, 4))  # 8x8 gray
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cached.png")
+            with open(path, "wb") as f:
+                f.write(_make_png_bytes(8, 8, 0, pixels))
+            image._scaled_cache.clear()
+            saved_disk_cache = image._disk_cache
+            image.enable_disk_cache(os.path.join(tmp, "cache"))
+            try:
+                first = image.render_png_grayscale_ansi256(path, max_width=4)
+                with patch.object(image, "_PngStream", side_effect=AssertionError("decoded again")):
+                    self.assertEqual(image.render_png_grayscale_ansi256(path, max_width=4), first)
+                    image.disable_disk_cache()
+                    # the scaled pixels are still in memory; only the bg changed
+                    self.assertNotEqual(image.render_png_grayscale_ansi256(path, max_width=4, bg=(9, 9, 9)), "")
+            finally:
+                image._disk_cache = saved_disk_cache
+                image._scaled_cache.clear()
+
+    def test_detect_color_mode(self):
+        self.assertEqual(image.detect_color_mode({"COLORTERM": "truecolor"}), "truecolor")
+        self.assertEqual(image.detect_color_mode({"TERM": "xterm-256color"}), "256")
+        self.assertEqual(image.detect_color_mode({"COLORTERM": "24bit", "TBOS_COLOR": "gray"}), "gray")
+
+    def test_color_lut_picks_nearest_palette_entry(self):
+        levels = image._CUBE_LEVELS
+        palette = {16 + i: (levels[i // 36], levels[i // 6 % 6], levels[i % 6]) for i in range(216)}
+        palette.update({232 + k: (8 + 10 * k,) * 3 for k in range(24)})
+        lut = image._get_color_lut()
+        for rgb in ((0, 0, 0), (255, 255, 255), (255, 0, 0), (123, 123, 123), (40, 200, 90), (250, 128, 10)):
+            q = [(c >> 3) * 255 // 31 for c in rgb]
+            code = lut[((rgb[0] >> 3) << 10) | ((rgb[1] >> 3) << 5) | (rgb[2] >> 3)]
+            dist = lambda c: sum((palette[c][i] - q[i]) ** 2 for i in range(3))
+            self.assertEqual(dist(code), min(dist(c) for c in palette), rgb)
+
+    def test_rgb_plane_and_color_codes(self):
+        pix = bytes([255, 0, 0, 255, 0, 0, 255, 0])  # opaque red, transparent
+        rgb = image._rgb_plane(pix, 2, 6, (0, 0, 255))
+        self.assertEqual(list(rgb), [255, 0, 0, 0, 0, 255])
+        self.assertEqual(list(image._cube_codes(rgb)), [196, 21])
+        self.assertEqual(image._packed_rgb(rgb), [0xFF0000, 0x0000FF])
+
+    def test_render_truecolor_and_cube_modes(self):
+        pixels = bytes([255, 0, 0, 0, 255, 0,
+                        0, 0, 255, 255, 255, 255])  # 2x2 RGB
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "color.png")
+            with open(path, "wb") as f:
+                f.write(_make_png_bytes(2, 2, 2, pixels))
+            true = image.render_png_ansi(path, max_width=2, mode="truecolor")
+            self.assertEqual(true, "\x1b[38;2;255;0;0m\x1b[48;2;0;0;255m▀\x1b[38;2;0;255;0m\x1b[48;2;255;255;255m▀\x1b[0m")
+            cube = image.render_png_ansi(path, max_width=2, mode="256")
+            self.assertEqual(cube, "\x1b[38;5;196m\x1b[48;5;21m▀\x1b[38;5;46m\x1b[48;5;231m▀\x1b[0m")
+            with self.assertRaises(ValueError):
+                image.render_png_ansi(path, mode="16")
+            image._scaled_cache.clear()
+
+    def test_gallery_lays_out_tiles_in_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(3):
+                with open(os.path.join(tmp, f"t{i}.png"), "wb") as f:
+                    f.write(_make_png_bytes(8, 4, 0, bytes(range(i, i + 32))))
+            with open(os.path.join(tmp, "broken.png"), "wb") as f:
+                f.write(b"not a png")
+            with open(os.path.join(tmp, "notes.txt"), "w") as f:
+                f.write("skipped")
+
+            for workers in (1, 2):
+                buf = io.StringIO()
+                with redirect_stdout(buf), patch("shutil.get_terminal_size", return_value=os.terminal_size((20, 24))):
+                    shown = image.gallery(tmp, tile_width=8, workers=workers, mode="gray")
+                self.assertEqual(shown, 4)
+                lines = buf.getvalue().splitlines()
+                # two tiles per 20-column row: each row is 2 lines of image plus a caption line
+                self.assertEqual(lines[2], "broken.p  t0.png  ")
+                self.assertTrue(lines[0].startswith("(unreada  \x1b["))
+                self.assertTrue(lines[1].startswith(" " * 10 + "\x1b["))  # shorter tile padded out
+                self.assertEqual(lines[-1], "t1.png    t2.png  ")
+                self.assertEqual(lines[-3].count("▀"), 16)
+            image._scaled_cache.clear()
+
 
 class TestScreensaver(unittest.TestCase):
-    def test_clear_calls_cls(self):
-        with patch("screensaver.os.system") as system:
+    def test_clear_writes_escapes_instead_of_cls(self):
+        buf = io.StringIO()
+        with redirect_stdout(buf), patch("os.system") as system:
             screensaver.clear()
-            system.assert_called_with("cls")
-
-    def test_get_keypress_checker_windows_branch(self):
-        # Force windows branch without requiring real msvcrt
-        fake_msvcrt = types.SimpleNamespace(kbhit=lambda: True)
-        with patch.object(screensaver, "os") as os_mod:
-            os_mod.name = "nt"
-            with patch.dict(sys.modules, {"msvcrt": fake_msvcrt}):
-                key_pressed = screensaver._get_keypress_checker()
-                self.assertTrue(callable(key_pressed))
-                self.assertTrue(key_pressed())
+        system.assert_not_called()
+        self.assertEqual(buf.getvalue(), "\x1b[2J\x1b[H")
 
     def test_matrix_screensaver_exits_immediately(self):
-        # Patch keypress to True immediately so it exits fast.
-        def fake_key_checker():
-            return lambda: True
-
+        # A key is already waiting, so it exits fast.
         buf = io.StringIO()
         with redirect_stdout(buf), \
-             patch("screensaver._get_keypress_checker", side_effect=fake_key_checker), \
-             patch("screensaver.os.name", "nt"), \
-             patch("screensaver.shutil.get_terminal_size", return_value=os.terminal_size((20, 10))), \
-             patch("screensaver.time.sleep", return_value=None):
+             patch("apps.screensaver.Keyboard", _ScriptedKeyboard([["x"]])), \
+             patch("apps.screensaver.shutil.get_terminal_size", return_value=os.terminal_size((20, 10))), \
+             patch("utils.frames.time.sleep", return_value=None):
             screensaver.matrix_screensaver(fps=999, density=0.0)
         # Should have printed ANSI sequences at least once (hide cursor or clear)
         out = buf.getvalue()
         self.assertTrue("\x1b" in out or out == "")
 
+    def _run_rain(self, rain, frames, screen):
+        import re as _re
+        outputs = []
+        for _ in range(frames):
+            out = rain.step()
+            outputs.append(out)
+            if out.startswith("\x1b[2J"):
+                screen.clear()
+            writes = _re.findall(r"\x1b\[(\d+);(\d+)H(.)", out)
+            self.assertLessEqual(len(writes), rain.cols * rain.rows)
+            for row, col, ch in writes:
+                screen[(int(col) - 1, int(row) - 1)] = ch
+        return outputs
+
+    def _assert_rain_on_screen(self, rain, screen):
+        visible = {pos for pos, ch in screen.items() if ch != " "}
+        expected = set()
+        for x, y in enumerate(rain.drops):
+            if y != screensaver.IDLE:
+                expected.update((x, y - d) for d in range(rain.TRAIL_LEN + 1)
+                                if 0 <= y - d < rain.rows and rain.glyph_at(x, y - d) != " ")
+        self.assertEqual(visible, expected)
+        self.assertEqual(len(expected), sum(1 for g in rain.cells if g))  # nothing left behind the trails
+        self.assertEqual({pos: screen[pos] for pos in expected}, {pos: rain.glyph_at(*pos) for pos in expected})
+
+    def test_matrix_rain_writes_only_changed_cells(self):
+        import random as _random
+        for use_numpy in (False, True) if screensaver.np is not None else (False,):
+            rain = screensaver.MatrixRain(30, 12, density=0.3, rng=_random.Random(4), use_numpy=use_numpy)
+            screen = {}
+            outputs = self._run_rain(rain, 150, screen)
+            self.assertTrue(outputs[0].startswith("\x1b[2J"))
+            self.assertFalse(any(out.startswith("\x1b[2J") for out in outputs[1:]))
+            self._assert_rain_on_screen(rain, screen)
+            self.assertLessEqual(sum(1 for ch in screen.values() if ch != " "), 30 * 12)
+
+    def test_matrix_rain_resize_keeps_overlap(self):
+        import random as _random
+        for use_numpy in (False, True) if screensaver.np is not None else (False,):
+            rain = screensaver.MatrixRain(30, 12, density=0.3, rng=_random.Random(7), use_numpy=use_numpy)
+            screen = {}
+            self._run_rain(rain, 40, screen)
+            kept = {(x, y): rain.glyph_at(x, y) for x in range(10) for y in range(5)}
+            rain.resize(10, 5)
+            self.assertEqual(len(rain.cells), 50)
+            self.assertEqual({(x, y): rain.glyph_at(x, y) for x in range(10) for y in range(5)}, kept)
+            outputs = self._run_rain(rain, 30, screen)
+            self.assertTrue(outputs[0].startswith("\x1b[2J"))
+            self._assert_rain_on_screen(rain, screen)
+
 
 class TestSnakeAndTetris(unittest.TestCase):
     def test_snake_main_quits_on_q(self):
-        # Make msvcrt return 'q' immediately.
-        with patch("snake.msvcrt.kbhit", return_value=True), \
-             patch("snake.msvcrt.getch", return_value=b"q"), \
-             patch("snake.os.system", return_value=0), \
-             patch("snake.time.sleep", return_value=None):
+        with patch("apps.snake.Keyboard", _ScriptedKeyboard([["q"]])), \
+             patch("utils.frames.time.sleep", return_value=None):
             buf = io.StringIO()
             with redirect_stdout(buf):
                 snake.snake_main()
             self.assertIn("Thanks for playing", buf.getvalue())
 
     def test_tetris_quits_on_q(self):
-        with patch("tetris.msvcrt.kbhit", return_value=True), \
-             patch("tetris.msvcrt.getch", return_value=b"q"), \
-             patch("tetris.os.system", return_value=0), \
-             patch("tetris.time.sleep", return_value=None), \
-             patch("tetris.time.time", side_effect=[0.0, 0.0, 0.0]):
-            # time.time called at least twice; side_effect provides enough.
+        with patch("apps.tetris.Keyboard", _ScriptedKeyboard([["q"]])), \
+             patch("utils.frames.time.sleep", return_value=None):
             buf = io.StringIO()
             with redirect_stdout(buf):
                 tetris.tetris()
@@ -263,6 +887,596 @@ class TestSnakeAndTetris(unittest.TestCase):
             self.assertTrue(True)
 
 
+class TestRegistry(unittest.TestCase):
+    def test_app_module_imported_on_first_run_only(self):
+        calls = []
+        fake = types.ModuleType("_tbos_fake_app")
+        fake.start = lambda *args: calls.append(args)
+        app = registry.App("fake", "_tbos_fake_app", {"run fake": ("start", (1, 2))})
+
+        with patch.dict(sys.modules, {"_tbos_fake_app": fake}), \
+             patch("apps.registry.importlib.import_module", wraps=registry.importlib.import_module) as imp:
+            self.assertEqual(imp.call_count, 0)
+            app.run("run fake")
+            app.run("run fake")
+            self.assertEqual(imp.call_count, 1)
+        self.assertEqual(calls, [(1, 2), (1, 2)])
+
+    def test_build_commands_gates_uninstalled_apps(self):
+        app = registry.App("fake", "_tbos_fake_app", {"run fake": ("start", ())}, install_id=7)
+        installed = []
+        table = registry.build_commands([app], lambda a: a in installed, installed.append)
+        self.assertEqual(set(table), {"run fake", "install fake"})
+
+        buf = io.StringIO()
+        with redirect_stdout(buf):
+            table["run fake"]()
+        self.assertIn("not installed", buf.getvalue())
+
+        table["install fake"]()
+        self.assertEqual(installed, [app])
+
+    def test_resolve_passes_rest_of_line_to_arg_commands(self):
+        calls = []
+        fake = types.ModuleType("_tbos_fake_app")
+        fake.show = lambda *args: calls.append(args)
+        app = registry.App("fake", "_tbos_fake_app", {"show": ("show", ()), "show all": ("show", ("*",))},
+                           arg_commands={"show"})
+        table = registry.build_commands([app], lambda a: True, None)
+        table["plain"] = lambda: None
+
+        with patch.dict(sys.modules, {"_tbos_fake_app": fake}):
+            for line in ("show", "show all", "show some/dir ", "plain"):
+                handler, args = registry.resolve(table, line)
+                handler(*args)
+        self.assertEqual(calls, [(), ("*",), ("some/dir",)])
+        self.assertEqual(registry.resolve(table, "plain extra"), (None, ()))
+        self.assertEqual(registry.resolve(table, "nope"), (None, ()))
+
+    def test_registered_apps_point_at_real_entries(self):
+        for app in registry.APPS:
+            module = app.load()
+            for entry, _args in app.commands.values():
+                self.assertTrue(callable(getattr(module, entry)), f"{app.name}.{entry}")
+
+
+class TestBoot(unittest.TestCase):
+    def test_fast_boot_flag_and_env(self):
+        self.assertTrue(boot.fast_boot_requested(["tbos", "--fast-boot"], {}))
+        self.assertTrue(boot.fast_boot_requested(["tbos"], {"TBOS_FAST_BOOT": "1"}))
+        self.assertFalse(boot.fast_boot_requested(["tbos"], {"TBOS_FAST_BOOT": "0"}))
+        self.assertFalse(boot.fast_boot_requested(["tbos"], {}))
+
+    def test_report_lists_phases_and_budget(self):
+        ticks = iter([0.0, 0.0, 0.25, 0.5, 0.5])
+        timer = boot.BootTimer(clock=lambda: next(ticks))
+        with timer.phase("imports"):
+            pass
+        timer.skip("self-test", "deferred")
+        timer.mark("first prompt")
+        report = timer.report(budget_ms=100)
+
+        self.assertIn("imports", report)
+        self.assertIn("250.0ms", report)
+        self.assertIn("deferred", report)
+        self.assertIn("OVER BUDGET", report)
+
+
+class TestInstalledApps(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "installed_apps.txt")
+        self.restore_data = _isolate_data_layers()
+
+    def tearDown(self):
+        self.restore_data()
+        self.tmp.cleanup()
+
+    def test_changes_persist_without_explicit_save(self):
+        apps = InstalledApps(self.path).load()
+        self.assertTrue(apps.add(1))
+        self.assertFalse(apps.add(1))
+        apps.add_many([2, 3])
+        apps.remove(2)
+
+        reloaded = InstalledApps(self.path).load()
+        self.assertEqual(list(reloaded), [1, 3])
+        self.assertIn(3, reloaded)
+        self.assertNotIn(2, reloaded)
+
+    def test_migrates_legacy_repr_format(self):
+        with open(self.path, "w") as f:
+            f.write("['1', '3']")
+        apps = InstalledApps(self.path).load()
+        self.assertEqual(list(apps), [1, 3])
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "tbos-apps 1\n+1\n+3\n")
+
+    def test_torn_last_line_is_ignored_and_log_compacts(self):
+        apps = InstalledApps(self.path).load()
+        for _ in range(20):
+            apps.add(5)
+            apps.remove(5)
+        with open(self.path, "a") as f:
+            f.write("+")  # crash mid-append
+        apps = InstalledApps(self.path).load()
+        self.assertEqual(len(apps), 0)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "tbos-apps 1\n")
+
+    def test_torn_tail_is_dropped_before_next_append(self):
+        with open(self.path, "w") as f:
+            f.write("tbos-apps 1\n+1\n+3\n-")
+        apps = InstalledApps(self.path).load()
+        self.assertEqual(list(apps), [1, 3])
+        apps.add(2)
+        self.assertEqual(list(InstalledApps(self.path).load()), [1, 2, 3])
+
+
+class TestData(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "lines.txt")
+        self.restore_data = _isolate_data_layers()
+
+    def tearDown(self):
+        self.restore_data()
+        self.tmp.cleanup()
+
+    def test_read_honors_char_limit(self):
+        data.write(self.path, "abcdef")
+        self.assertEqual(data.read(self.path, 3), "abc")
+        self.assertEqual(data.read(self.path, None), "abcdef")
+
+    def test_read_line_uses_index(self):
+        data.write(self.path, "one\ntwo\r\n\nfour")
+        self.assertEqual(data.readLine(self.path, 1), "one")
+        self.assertEqual(data.readLine(self.path, 2), "two")
+        self.assertEqual(data.readLine(self.path, 3), "")
+        self.assertEqual(data.readLine(self.path, 4), "four")
+        self.assertEqual(data.getLineCount(self.path), 4)
+        self.assertTrue(os.path.exists(self.path + ".idx"))
+        with self.assertRaises(IndexError):
+            data.readLine(self.path, 5)
+
+    def test_async_batch_roundtrip(self):
+        files = {os.path.join(self.tmp.name, f"f{i}.txt"): f"line {i}\nsecond {i}" for i in range(20)}
+
+        async def roundtrip():
+            await data.awriteMany(files, atomic=True)
+            contents = await data.areadMany(list(files))
+            second = await data.areadLine(next(iter(files)), 2)
+            missing = await data.areadMany([self.path], return_exceptions=True)
+            return contents, second, missing
+
+        contents, second, missing = asyncio.run(roundtrip())
+        self.assertEqual(contents, list(files.values()))
+        self.assertEqual(second, "second 0")
+        self.assertIsInstance(missing[0], FileNotFoundError)
+
+    def test_read_line_index_rebuilt_after_change(self):
+        data.write(self.path, "a\nb\n")
+        self.assertEqual(data.getLineCount(self.path), 2)
+        data.write(self.path, "a\nb\nlonger third line\n")
+        self.assertEqual(data.readLine(self.path, 3), "longer third line")
+
+
+class TestFileCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "save.txt")
+        self.now = 0.0
+        self.restore_data = _isolate_data_layers()
+
+    def tearDown(self):
+        self.restore_data()
+        self.tmp.cleanup()
+
+    def test_repeated_reads_hit_and_local_write_invalidates(self):
+        data.write(self.path, "first\nsecond\n")
+        data.enableCache()
+        self.assertEqual(data.read(self.path, None), "first\nsecond\n")
+        misses = data.cacheStats()["misses"]
+        self.assertEqual(data.readLine(self.path, 2), "second")
+        self.assertEqual(data.read(self.path, 5), "first")
+        self.assertEqual(data.cacheStats()["misses"], misses)
+        self.assertGreater(data.cacheStats()["hits"], 0)
+
+        data.write(self.path, "changed")
+        self.assertEqual(data.read(self.path, None), "changed")
+        self.assertTrue(data.getFileExists(self.path))
+
+    def test_peek_at_file_larger_than_cache_is_not_loaded_whole(self):
+        data.write(self.path, "x" * 4096)
+        data.enableCache(max_bytes=1024)
+        with patch.object(FileCache, "text", side_effect=AssertionError("whole file read")):
+            self.assertEqual(data.read(self.path, 10), "x" * 10)
+
+    def test_stale_after_external_change_once_ttl_expires(self):
+        cache = FileCache(stat_ttl=1.0, clock=lambda: self.now)
+        with open(self.path, "w") as f:
+            f.write("v1")
+        self.assertEqual(cache.text(self.path), "v1")
+        with open(self.path, "w") as f:
+            f.write("v2 longer")
+        self.now = 2.0
+        self.assertEqual(cache.text(self.path), "v2 longer")
+
+    def test_lru_evicts_oldest(self):
+        cache = FileCache(max_entries=2)
+        paths = []
+        for name in "abc":
+            p = os.path.join(self.tmp.name, name)
+            with open(p, "w") as f:
+                f.write(name)
+            paths.append(p)
+            cache.text(p)
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertGreater(stats["evictions"], 0)
+
+
+class TestWriteJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal_path = os.path.join(self.tmp.name, ".journal")
+        self.target = os.path.join(self.tmp.name, "score.txt")
+        self.restore_data = _isolate_data_layers()
+
+    def tearDown(self):
+        self.restore_data()
+        self.tmp.cleanup()
+
+    def _apply(self, path, content):
+        with open(path, "w") as f:
+            f.write(content)
+
+    def test_writes_visible_before_checkpoint_and_applied_after(self):
+        data.enableWriteBehind(self.journal_path, max_delay=60, checkpoint_bytes=1 << 30)
+        for score in range(50):
+            data.write(self.target, str(score))
+        self.assertFalse(os.path.exists(self.target))
+        self.assertEqual(data.read(self.target, None), "49")
+        self.assertTrue(data.getFileExists(self.target))
+
+        data.flushWrites()
+        self.assertGreater(os.path.getsize(self.journal_path), 0)
+
+        data.disableWriteBehind()
+        with open(self.target) as f:
+            self.assertEqual(f.read(), "49")
+        self.assertEqual(os.path.getsize(self.journal_path), 0)
+
+    def test_append_and_write_atomic_commit_before_returning(self):
+        data.enableWriteBehind(self.journal_path, max_delay=60, checkpoint_bytes=1 << 30)
+        data.writeAtomic(self.target, "saved")
+        committed = os.path.getsize(self.journal_path)
+        self.assertGreater(committed, 0)
+        data.append(self.target, " more")
+        self.assertGreater(os.path.getsize(self.journal_path), committed)
+
+        # what a crash would leave: only the journal file
+        WriteJournal(self.journal_path, self._apply).replay()
+        with open(self.target) as f:
+            self.assertEqual(f.read(), "saved more")
+
+    def test_replay_after_crash_stops_at_torn_record(self):
+        journal = WriteJournal(self.journal_path, self._apply)
+        journal.write(self.target, "saved")
+        journal.commit()
+        journal.write(self.target, "lost")
+        journal.commit()
+        with open(self.journal_path, "r+b") as f:
+            f.truncate(os.path.getsize(self.journal_path) - 2)  # crash mid-record
+
+        restored = WriteJournal(self.journal_path, self._apply).replay()
+        self.assertEqual(restored, 1)
+        with open(self.target) as f:
+            self.assertEqual(f.read(), "saved")
+
+    def test_background_flusher_group_commits(self):
+        journal = WriteJournal(self.journal_path, self._apply, max_pending_bytes=1, max_delay=60).start()
+        journal.write(self.target, "x")
+        deadline = time.time() + 5
+        while journal.commits == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        journal.close()
+        self.assertGreaterEqual(journal.commits, 1)
+        with open(self.target) as f:
+            self.assertEqual(f.read(), "x")
+
+
+class TestPackFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "save.pack")
+
+    def tearDown(self):
+        data.unmount("_pack_test/")
+        self.tmp.cleanup()
+
+    def test_reopen_recovers_unsynced_writes_and_skips_torn_tail(self):
+        pack = PackFile(self.path, fsync=False)
+        pack.write("a.txt", "one")
+        pack.sync()
+        pack.write("b.txt", "two")
+        pack.write("a.txt", "three")
+        pack.delete("b.txt")
+        pack._f.write(b"TBVR\x05")  # torn record from a crash
+        pack._f.flush()
+        pack._close_handles()
+
+        pack = PackFile(self.path, fsync=False)
+        self.assertEqual(pack.read("a.txt"), "three")
+        self.assertNotIn("b.txt", pack)
+        self.assertIsInstance(pack.read_bytes("a.txt", verify=True), memoryview)
+        pack.write("c.txt", "after")
+        pack.close()
+        self.assertEqual(PackFile(self.path).names(), ["a.txt", "c.txt"])
+
+    def test_compaction_drops_garbage(self):
+        pack = PackFile(self.path, fsync=False, compact_min_bytes=1000)
+        for i in range(100):
+            pack.write("score", f"{i:050d}")
+        pack.write("other", "x")
+        self.assertLess(os.path.getsize(self.path), 3000)
+        self.assertEqual(pack.read("score"), f"{99:050d}")
+        pack.close()
+
+    def test_reopened_pack_of_small_files_is_not_garbage(self):
+        pack = PackFile(self.path, fsync=False, compact_min_bytes=1000)
+        for i in range(2000):
+            pack.write(f"f{i}", "12345678")
+        pack.close()
+
+        pack = PackFile(self.path, fsync=False, compact_min_bytes=1000)
+        self.assertEqual(pack._dead_bytes, 0)
+        pack.compact = lambda: self.fail("a single small write compacted the pack")
+        pack.write("f0", "87654321")
+        pack.close()
+
+        pack = PackFile(self.path, fsync=False)
+        pack.compact()
+        self.assertEqual(pack._dead_bytes, 0)
+        self.assertEqual(pack.read("f0"), "87654321")
+        pack.close()
+
+    def test_header_pointing_at_missing_index_falls_back_to_scan(self):
+        pack = PackFile(self.path, fsync=False)
+        pack.write("a.txt", "one")
+        pack.write("b.txt", "two")
+        pack._f.seek(0)
+        pack._f.write(struct.pack("<8sQQ", b"TBVFS001", os.path.getsize(self.path), 40))
+        pack._f.flush()
+        pack._close_handles()
+
+        pack = PackFile(self.path, fsync=False)
+        self.assertEqual(pack.names(), ["a.txt", "b.txt"])
+        self.assertEqual(pack.read("b.txt"), "two")
+        pack.close()
+        self.assertEqual(PackFile(self.path).read("a.txt"), "one")
+
+    def test_data_functions_route_to_mounted_pack(self):
+        data.mount(self.path, "_pack_test/")
+        data.write("_pack_test/dir/file.txt", "x\ny\n")
+        data.append("_pack_test/dir/file.txt", "z")
+        self.assertTrue(data.getFileExists("_pack_test/dir/file.txt"))
+        self.assertTrue(data.getFolderExists("_pack_test/dir"))
+        self.assertEqual(data.readLine("_pack_test/dir/file.txt", 3), "z")
+        self.assertEqual(data.read("_pack_test/dir/file.txt", 1), "x")
+        data.delete_file("_pack_test/dir/file.txt")
+        self.assertFalse(data.getFileExists("_pack_test/dir/file.txt"))
+        self.assertEqual(os.listdir(self.tmp.name), ["save.pack"])
+
+
+class TestRenderCache(unittest.TestCase):
+    def test_lru_bounds_entries_and_bytes(self):
+        cache = LRUCache(max_entries=2, max_bytes=10)
+        cache.put("a", b"1234")
+        cache.put("b", b"5678")
+        cache.get("a")
+        cache.put("c", b"9")
+        self.assertIsNone(cache.get("b"))  # least recently used
+        self.assertEqual(cache.get("a"), b"1234")
+        cache.put("d", b"x" * 9)
+        self.assertEqual(cache.stats()["bytes"], 9)
+        cache.put("e", b"x" * 11)  # larger than the whole cache
+        self.assertIsNone(cache.get("e"))
+
+    def test_disk_cache_roundtrip_and_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = DiskCache(os.path.join(tmp, "c"), max_bytes=25)
+            cache.put(("k", 1), "a" * 10)
+            cache.put(("k", 2), "b" * 10)
+            old = time.time() - 100
+            os.utime(os.path.join(cache.directory, cache._name(("k", 1))), (old, old))
+            cache.put(("k", 3), "c" * 10)
+            self.assertIsNone(cache.get(("k", 1)))
+            self.assertEqual(cache.get(("k", 2)), "b" * 10)
+            self.assertEqual(cache.size(), 20)
+
+            # a new instance picks up what is already on disk
+            again = DiskCache(cache.directory, max_bytes=25)
+            self.assertEqual(again.get(("k", 3)), "c" * 10)
+            self.assertEqual(again.size(), 20)
+
+
+class TestFrameBuffer(unittest.TestCase):
+    def test_first_frame_draws_everything_then_only_changes(self):
+        out = io.StringIO()
+        fb = FrameBuffer(4, 2, out=out)
+        fb.put(0, 0, "ab")
+        fb.put(1, 1, "c", "\x1b[32m")
+        fb.present()
+        self.assertEqual(out.getvalue(),
+                         "\x1b[2J\x1b[1;1Hab  \x1b[2;1H \x1b[0m\x1b[32mc\x1b[0m  ")
+
+        out.seek(0)
+        out.truncate()
+        fb.clear()
+        fb.put(0, 0, "ab")
+        fb.put(1, 1, "d", "\x1b[32m")
+        fb.present()
+        self.assertEqual(out.getvalue(), "\x1b[2;2H\x1b[0m\x1b[32md\x1b[0m")
+
+        out.seek(0)
+        out.truncate()
+        fb.present()  # nothing changed: nothing written
+        self.assertEqual(out.getvalue(), "")
+
+    def test_put_clips_to_the_grid(self):
+        fb = FrameBuffer(3, 1, out=io.StringIO())
+        fb.put(-1, 0, "wxyz")
+        fb.put(0, 5, "ignored")
+        self.assertEqual(fb.chars, [["x", "y", "z"]])
+
+    def test_vt_mode_enabled_once_before_escapes(self):
+        calls = []
+        fake_ctypes = types.SimpleNamespace(windll=types.SimpleNamespace(kernel32=types.SimpleNamespace(
+            GetStdHandle=lambda n: n,
+            GetConsoleMode=lambda h, mode: calls.append("get") or 1,
+            SetConsoleMode=lambda h, mode: calls.append("set"))),
+            c_uint=lambda: types.SimpleNamespace(value=0), byref=lambda x: x)
+        out = io.StringIO()
+        with patch("utils.terminal._vt_checked", False), patch("utils.terminal.os.name", "nt"), \
+             patch.dict(sys.modules, {"ctypes": fake_ctypes}):
+            terminal.clear_screen(out)
+            fb = FrameBuffer(2, 1, out=out)
+            fb.put(0, 0, "ok")
+            fb.present()
+        self.assertEqual(calls, ["get", "set"])
+        self.assertTrue(out.getvalue().startswith("\x1b[2J"))
+
+    def test_snake_frames_are_single_writes(self):
+        writes = []
+        fake_out = types.SimpleNamespace(write=writes.append, flush=lambda: None)
+        with patch("apps.snake.Keyboard", _ScriptedKeyboard([["d"], ["d"], ["q"]])), \
+             patch("utils.frames.time.sleep", return_value=None), \
+             patch("sys.stdout", fake_out), patch("os.system") as system:
+            snake.snake_main()
+        system.assert_not_called()
+        full = [i for i, w in enumerate(writes) if w.startswith("\x1b[2J")]
+        self.assertEqual(len(full), 1)
+        # the next tick only rewrites the cells the snake moved through
+        self.assertLess(len(writes[full[0] + 1]), 40)
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestFrames(unittest.TestCase):
+    def test_sleep_absorbs_render_time(self):
+        fake = _FakeClock()
+        clock = FrameClock(0.1, clock=fake, sleep=fake.sleep)
+        clock.tick()  # first frame: nothing drawn, waits one period
+        for _ in range(5):
+            fake.now += 0.03  # drawing
+            self.assertEqual(clock.tick(), 0)
+        self.assertAlmostEqual(fake.now, 0.6)
+        for slept in fake.sleeps[1:]:
+            self.assertAlmostEqual(slept, 0.07)
+
+    def test_overrun_drops_missed_deadlines(self):
+        fake = _FakeClock()
+        clock = FrameClock(0.1, clock=fake, sleep=fake.sleep)
+        clock.tick()
+        fake.now += 0.25
+        self.assertEqual(clock.tick(), 2)
+        self.assertAlmostEqual(fake.now, 0.4)  # back on the 0.1 grid, no burst of catch-up frames
+        fake.now += 0.01
+        self.assertEqual(clock.tick(), 0)
+        self.assertAlmostEqual(fake.now, 0.5)
+        self.assertEqual(clock.stats.dropped, 2)
+        self.assertGreater(clock.load, 0.0)
+
+    def test_first_frame_is_timed_from_start(self):
+        fake = _FakeClock()
+        clock = FrameClock(0.1, clock=fake, sleep=fake.sleep)
+        fake.now += 5.0  # setup before the loop
+        clock.start()
+        fake.now += 0.04  # drawing the first frame
+        clock.tick()
+        self.assertAlmostEqual(clock.stats.worst, 0.04)
+        self.assertAlmostEqual(fake.sleeps[0], 0.06)
+        self.assertAlmostEqual(clock.load, 0.08)
+
+    def test_stats_percentiles_and_report(self):
+        stats = FrameStats()
+        for ms in range(1, 101):
+            stats.record(ms / 1000)
+        self.assertAlmostEqual(stats.percentile(50), 0.050, delta=2 * FrameStats.BUCKET)
+        self.assertAlmostEqual(stats.percentile(99), 0.099, delta=2 * FrameStats.BUCKET)
+        self.assertAlmostEqual(stats.percentile(100), 0.100, delta=2 * FrameStats.BUCKET)
+        self.assertRegex(stats.summary(), r"p95 95\.\dms")
+
+        clock = FrameClock(0.1)
+        clock.stats = stats
+        buf = io.StringIO()
+        clock.report(out=buf, environ={})
+        self.assertEqual(buf.getvalue(), "")
+        clock.report(out=buf, environ={"TBOS_FRAME_STATS": "1"})
+        self.assertIn("frames: 100", buf.getvalue())
+
+
+class TestKeyboard(unittest.TestCase):
+    def test_decoder_arrows_split_across_reads(self):
+        dec = KeyDecoder()
+        self.assertEqual(dec.feed(b"w\x1b[A\x1bOD"), ["w", "up", "left"])
+        self.assertEqual(dec.feed(b"\x1b["), [])
+        self.assertEqual(dec.feed(b"B\r\x7f"), ["down", "enter", "backspace"])
+        self.assertEqual(dec.feed(b"\x1b[15~q"), ["q"])  # F5: unknown, dropped whole
+        self.assertEqual(dec.feed("\u00e9".encode()[:1]), [])
+        self.assertEqual(dec.feed("\u00e9".encode()[1:]), ["\u00e9"])
+        self.assertEqual(dec.feed(b"\x1b"), [])
+        self.assertEqual(dec.flush(), ["esc"])
+        self.assertEqual(dec.flush(), [])
+
+    def test_decoder_windows_scan_codes(self):
+        dec = KeyDecoder(scan_codes=True)
+        self.assertEqual(dec.feed(b"\xe0H\x00Pa\xe0"), ["up", "down", "a"])
+        self.assertEqual(dec.feed(b"K"), ["left"])
+
+    def test_reader_thread_keeps_every_key_in_order(self):
+        r, w = os.pipe()
+        keyboard = Keyboard(source=_TerminalSource(r))
+        try:
+            with keyboard:
+                os.write(w, b"wasd\x1b[C" * 200)
+                events = []
+                deadline = time.monotonic() + 5
+                while len(events) < 1000 and time.monotonic() < deadline:
+                    events += keyboard.events()
+                    time.sleep(0.001)
+        finally:
+            os.close(r)
+            os.close(w)
+        self.assertEqual([e.key for e in events], ["w", "a", "s", "d", "right"] * 200)
+        self.assertEqual([e.time for e in events], sorted(e.time for e in events))
+        self.assertIsNone(keyboard._thread)
+
+    def test_console_source_reads_all_waiting_bytes(self):
+        waiting = [b"\xe0", b"M", b"q"]
+        fake_msvcrt = types.SimpleNamespace(kbhit=lambda: bool(waiting), getch=lambda: waiting.pop(0))
+        source = _ConsoleSource(fake_msvcrt)
+        data = source.read(0.01)
+        self.assertEqual(data, b"\xe0Mq")
+        self.assertEqual(source.read(0.01), b"")
+        keyboard = Keyboard(source=source)
+        keyboard.feed(data)
+        self.assertEqual([e.key for e in keyboard.events()], ["right", "q"])
+        self.assertFalse(keyboard.pending())
+
+
 # ---------------------------------------------------------------------------
 # Main: run and print success/failure summary
 # ---------------------------------------------------------------------------
@@ -277,6 +1491,7 @@ def main():
     else:
         print("SOME TESTS FAILED")
         print(f"Failures: {len(result.failures)}  Errors: {len(result.errors)}")
+    return result.success
 
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+import os
+import time
+from contextlib import contextmanager
+
+
+def fast_boot_requested(argv, environ=os.environ):
+    """Fast boot is on with --fast-boot or TBOS_FAST_BOOT set to anything but 0/empty."""
+    if "--fast-boot" in argv:
+        return True
+    return environ.get("TBOS_FAST_BOOT", "") not in ("", "0")
+
+
+def boot_budget_ms(environ=os.environ):
+    """Boot budget in milliseconds from TBOS_BOOT_BUDGET_MS, or None."""
+    try:
+        return float(environ["TBOS_BOOT_BUDGET_MS"])
+    except (KeyError, ValueError):
+        return None
+
+
+class BootTimer:
+    """Records how long each boot phase took, measured from construction."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.phases = []  # (name, seconds or None when skipped, note)
+        self.total = None
+
+    @contextmanager
+    def phase(self, name):
+        t0 = self.clock()
+        try:
+            yield
+        finally:
+            self.phases.append((name, self.clock() - t0, ""))
+
+    def skip(self, name, note):
+        self.phases.append((name, None, note))
+
+    def mark(self, name):
+        """Record a phase that ends now and started when the timer did; it becomes the boot total."""
+        self.total = self.clock() - self.started
+        self.phases.append((name, self.total, "since start"))
+
+    def report(self, budget_ms=None):
+        lines = ["boot phases:"]
+        for name, seconds, note in self.phases:
+            if seconds is None:
+                lines.append(f"  {name:<16} {'-':>9}  {note}")
+            else:
+                extra = f"  ({note})" if note else ""
+                lines.append(f"  {name:<16} {seconds * 1000:>7.1f}ms{extra}")
+        total = self.total if self.total is not None else self.clock() - self.started
+        total_ms = total * 1000
+        lines.append(f"  {'total':<16} {total_ms:>7.1f}ms")
+        if budget_ms is not None:
+            status = "ok" if total_ms <= budget_ms else "OVER BUDGET"
+            lines.append(f"  {'budget':<16} {budget_ms:>7.1f}ms  {status}")
+        return "\n".join(lines)
@@ -1,44 +1,287 @@
+import functools
 import os
+import struct
+import sys
+import threading
+from array import array
+
+from utils.filecache import FileCache, split_lines
+from utils.journal import WriteJournal
+from utils.vfs import PackFile
+
+_LINE_INDEX_MAGIC = b"TBLIDX01"
+_LINE_INDEX_HEADER = struct.Struct("<8sQQQ")  # magic, mtime_ns, size, line count
+_READ_BLOCK = 1 << 20
+
+# paths are relative to the tbos root (the folder that holds utils/ and save_data/)
+_BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_cache = None
+_journal = None
+_mounts = {}  # "save_data/" -> PackFile
+
+_io_workers = min(8, (os.cpu_count() or 1) + 4)
+_io_pool = None
+_io_pool_lock = threading.Lock()
 
 def _resolve_path(relative_path: str) -> str:
-    base = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(base, relative_path)
+    return os.path.join(_BASE, relative_path)
+
+def enableCache(max_entries=128, max_bytes=8 * 1024 * 1024, stat_ttl=1.0):
+    """
+    Serve read/readLine/getFileExists/getFolderExists from an in-memory LRU.
+    Writes made through this module invalidate it straight away; changes
+    made by other processes are picked up within stat_ttl seconds.
+    """
+    global _cache
+    _cache = FileCache(max_entries, max_bytes, stat_ttl)
+    return _cache
+
+def disableCache():
+    global _cache
+    _cache = None
+
+def cacheStats():
+    """Hit/miss/eviction counters of the cache, or None when it is off."""
+    return _cache.stats() if _cache is not None else None
+
+def enableWriteBehind(journal_path="save_data/.journal", max_pending_bytes=64 * 1024,
+                      max_delay=0.5, checkpoint_bytes=1024 * 1024):
+    """
+    Turn write() into an append to a group-committed journal (see
+    utils.journal). writeAtomic() and append() still promise durability,
+    so they commit the journal before returning. A journal left behind by
+    a crash is replayed first.
+    Returns the number of files restored by that replay.
+    """
+    global _journal
+    disableWriteBehind()
+    path2 = _resolve_path(journal_path)
+    os.makedirs(os.path.dirname(path2), exist_ok=True)
+    journal = WriteJournal(path2, _write_in_place, max_pending_bytes, max_delay, checkpoint_bytes)
+    restored = journal.replay()
+    _journal = journal.start()
+    return restored
+
+def disableWriteBehind():
+    """Checkpoint everything journaled and go back to direct writes."""
+    global _journal
+    if _journal is not None:
+        journal, _journal = _journal, None
+        journal.close()
+
+def flushWrites():
+    """Force a group commit of buffered writes to the journal."""
+    if _journal is not None:
+        _journal.commit()
+
+def mount(pack_path, prefix="save_data/"):
+    """
+    Serve every path under `prefix` from the pack file at `pack_path`
+    (created if missing) instead of from individual files. See utils.vfs.
+    """
+    prefix = prefix.rstrip("/") + "/"
+    unmount(prefix)
+    pack = PackFile(_resolve_path(pack_path))
+    _mounts[prefix] = pack
+    return pack
+
+def unmount(prefix="save_data/"):
+    pack = _mounts.pop(prefix.rstrip("/") + "/", None)
+    if pack is not None:
+        pack.close()
+
+def _mounted(file_path):
+    """(pack, name inside it) when file_path is under a mount, else (None, None)."""
+    if _mounts:
+        norm = file_path.replace(os.sep, "/")
+        for prefix, pack in _mounts.items():
+            if norm.startswith(prefix):
+                return pack, norm[len(prefix):]
+    return None, None
+
+def _write_in_place(path2, content):
+    tmp = _tmp_path(path2)
+    os.makedirs(os.path.dirname(path2), exist_ok=True)
+
+    with open(tmp, "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path2)
+    _invalidate(path2)
+
+def _journaled(path2):
+    """Content still waiting in the journal for path2, or None."""
+    return _journal.get(path2) if _journal is not None else None
+
+def _tmp_path(path2):
+    # unique per thread so concurrent writers never share a temp file
+    return f"{path2}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def _invalidate(path2):
+    if _cache is not None:
+        _cache.invalidate(path2)
 
 def create(path, extension):
+    pack, name = _mounted(path + extension)
+    if pack is not None:
+        pack.write(name, "Hello, world!")
+        return
     path2 = _resolve_path(path) + extension
-    
+    if _journal is not None:
+        _journal.write(path2, "Hello, world!")
+        return
     
     with open(path2, "w") as f:
         f.write("Hello, world!")
+    _invalidate(path2)
  
 def write(file_path, content):
+    pack, name = _mounted(file_path)
+    if pack is not None:
+        pack.write(name, content)
+        return
     path2 = _resolve_path(file_path)
-    
+    if _journal is not None:
+        _journal.write(path2, content)
+        return
     
     with open(path2, "w") as f:
         f.write(content)
+    _invalidate(path2)
  
+def writeAtomic(file_path, content):
+    """Replace the file in one step: write a temp file next to it, fsync, rename over."""
+    pack, name = _mounted(file_path)
+    if pack is not None:
+        # a pack write is already an append of the complete new content
+        pack.write(name, content)
+        return
+    path2 = _resolve_path(file_path)
+    if _journal is not None:
+        # a journal commit is already atomic and durable; make it now, not at the next group commit
+        _journal.write(path2, content)
+        _journal.commit()
+        return
+    _write_in_place(path2, content)
+
+def writeChunks(file_path, chunks, before_replace=None):
+    """
+    Write an iterable of str (UTF-8 encoded) or bytes chunks as the new
+    content of the file without joining them first. Like writeAtomic, the
+    file is replaced in one step. Bytes are written as they are, whatever
+    their encoding.
+
+    before_replace is called once the chunks are on disk, just before the
+    swap; a caller streaming from the file itself closes it there, since
+    Windows refuses to replace a file that is open or mapped.
+
+    This bypasses write-behind: the journal holds whole strings, which is
+    what streaming avoids, so the file goes straight to disk.
+    """
+    pack, name = _mounted(file_path)
+    if pack is not None:
+        # a pack record holds the whole content anyway
+        pack.write(name, b"".join(c.encode("utf-8") if isinstance(c, str) else c for c in chunks))
+        if before_replace is not None:
+            before_replace()
+        return
+    path2 = _resolve_path(file_path)
+    if _journaled(path2) is not None:
+        # settle the journal first so neither a checkpoint nor a replay can bring back its older copy
+        _journal.checkpoint()
+
+    tmp = _tmp_path(path2)
+    os.makedirs(os.path.dirname(path2), exist_ok=True)
+    with open(tmp, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        if before_replace is not None:
+            before_replace()
+        os.replace(tmp, path2)
+    except OSError:
+        os.remove(tmp)  # the old file is untouched; don't leave the new one lying next to it
+        raise
+    _invalidate(path2)
+
+def getPath(file_path):
+    """
+    Absolute path of a tbos-relative path, for code that needs the real
+    file (e.g. to mmap it). Content still in the write-behind journal is
+    written out first, so the file is current.
+    """
+    path2 = _resolve_path(file_path)
+    if _journaled(path2) is not None:
+        _journal.checkpoint()
+    return path2
+
+def append(file_path, content):
+    """Append to the file and fsync, so the data survives a crash."""
+    pack, name = _mounted(file_path)
+    if pack is not None:
+        pack.write(name, (pack.read(name) if name in pack else "") + content)
+        return
+    path2 = _resolve_path(file_path)
+    pending = _journaled(path2)
+    if pending is not None:
+        _journal.write(path2, pending + content)
+        _journal.commit()
+        return
+
+    with open(path2, "a") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    _invalidate(path2)
+
 def read(file_path, amount_of_chars):
+    """Read at most amount_of_chars characters; None (or a negative number) reads everything."""
+    if amount_of_chars is None or amount_of_chars < 0:
+        amount_of_chars = -1
+
+    pack, name = _mounted(file_path)
     path2 = _resolve_path(file_path)
-    
-    
+    text = pack.read(name) if pack is not None else _journaled(path2)
+    if text is None and _cache is not None:
+        # only files the cache can hold; a short peek at a big file stays a short read
+        st = _cache.stat(path2)
+        if st is not None and st.st_size <= _cache.max_bytes:
+            text = _cache.text(path2)
+    if text is not None:
+        return text if amount_of_chars < 0 else text[:amount_of_chars]
+
     with open(path2, "r") as f:
-        content = f.read()
+        content = f.read(amount_of_chars)
     return content
 
  
 def createFolder(name):
     try:
+        pack, _ = _mounted(name.rstrip("/") + "/")
+        if pack is not None:
+            return  # folders inside a pack are implied by file names
         path2 = _resolve_path(name)
         
         os.mkdir(path2)
+        _invalidate(path2)
     except Exception as e:
         print(e)
  
 def getFolderExists(path):
     try:
+        pack, name = _mounted(path.rstrip("/") + "/")
+        if pack is not None:
+            return name == "" or bool(pack.names(name))
         path2 = _resolve_path(path)
         
+        if _journaled(path2) is not None:
+            return True
+        if _cache is not None:
+            return _cache.stat(path2) is not None
         if os.path.exists(path2):
             return True
         else:
@@ -48,8 +291,15 @@ def getFolderExists(path):
  
 def getFileExists(path):
     try:
+        pack, name = _mounted(path)
+        if pack is not None:
+            return name in pack
         path2 = _resolve_path(path)
         
+        if _journaled(path2) is not None:
+            return True
+        if _cache is not None:
+            return _cache.stat(path2) is not None
         if os.path.exists(path2):
             return True
         else:
@@ -59,16 +309,186 @@ def getFileExists(path):
 
  
 def readLine(file_path, line):
+    """
+    Return line number `line` (1-based) without its line ending.
+
+    Uses a line-offset index stored next to the file as `<file>.idx`. The
+    index is built in one streaming pass the first time it is needed and
+    rebuilt whenever the file's mtime or size changes; after that each call
+    is two seeks, whatever the size of the file. With the cache enabled,
+    files that fit in it are answered from memory instead.
+    """
     path2 = _resolve_path(file_path)
-    
-    
-    with open(path2, "r") as f:
-        content = f.read()
-    return content
+    lines = _lines_in_memory(file_path, path2)
+    if lines is not None:
+        if line < 1 or line > len(lines):
+            raise IndexError(f"line {line} out of range (file has {len(lines)} lines)")
+        return lines[line - 1]
+
+    count = _ensure_line_index(path2)
+    if line < 1 or line > count:
+        raise IndexError(f"line {line} out of range (file has {count} lines)")
+
+    with open(_line_index_path(path2), "rb") as idx:
+        idx.seek(_LINE_INDEX_HEADER.size + (line - 1) * 8)
+        start, end = struct.unpack("<QQ", idx.read(16))
+
+    with open(path2, "rb") as f:
+        f.seek(start)
+        raw = f.read(end - start)
+    if raw.endswith(b"\n"):
+        raw = raw[:-1]
+        if raw.endswith(b"\r"):
+            raw = raw[:-1]
+    return raw.decode("utf-8")
+
+def getLineCount(file_path):
+    path2 = _resolve_path(file_path)
+    lines = _lines_in_memory(file_path, path2)
+    if lines is not None:
+        return len(lines)
+    return _ensure_line_index(path2)
+
+def _lines_in_memory(file_path, path2):
+    """Lines of the file if a pack, the journal or the cache can answer without touching the index."""
+    pack, name = _mounted(file_path)
+    if pack is not None:
+        return split_lines(pack.read(name))
+    text = _journaled(path2)
+    if text is not None:
+        return split_lines(text)
+    if _cache is not None:
+        st = _cache.stat(path2)
+        if st is not None and st.st_size <= _cache.max_bytes:
+            return _cache.lines(path2)
+    return None
+
+def _line_index_path(path2):
+    return path2 + ".idx"
+
+def _ensure_line_index(path2):
+    """Make sure the index for path2 is current and return the file's line count."""
+    st = os.stat(path2)
+    try:
+        with open(_line_index_path(path2), "rb") as idx:
+            magic, mtime_ns, size, count = _LINE_INDEX_HEADER.unpack(idx.read(_LINE_INDEX_HEADER.size))
+        if magic == _LINE_INDEX_MAGIC and mtime_ns == st.st_mtime_ns and size == st.st_size:
+            return count
+    except (OSError, struct.error):
+        pass
+    return _build_line_index(path2, st)
+
+def _build_line_index(path2, st):
+    # offsets[i] is where line i+1 starts; a final entry holds the file size
+    offsets = array("Q", [0])
+    pos = 0
+    with open(path2, "rb") as f:
+        while True:
+            block = f.read(_READ_BLOCK)
+            if not block:
+                break
+            i = block.find(b"\n")
+            while i != -1:
+                offsets.append(pos + i + 1)
+                i = block.find(b"\n", i + 1)
+            pos += len(block)
+
+    if offsets[-1] == pos:
+        offsets.pop()  # the file ends with a newline or is empty: no extra line
+    count = len(offsets)
+    offsets.append(pos)
+    if sys.byteorder == "big":
+        offsets.byteswap()
+
+    idx_path = _line_index_path(path2)
+    tmp = _tmp_path(idx_path)
+    with open(tmp, "wb") as idx:
+        idx.write(_LINE_INDEX_HEADER.pack(_LINE_INDEX_MAGIC, st.st_mtime_ns, st.st_size, count))
+        offsets.tofile(idx)
+    os.replace(tmp, idx_path)
+    return count
 
 def delete_file(file_path):
-    if getFileExists(file_path):
-        file_path.unlink()
+    pack, name = _mounted(file_path)
+    if pack is not None and name in pack:
+        pack.delete(name)
+    elif getFileExists(file_path):
+        path2 = _resolve_path(file_path)
+        if _journaled(path2) is not None:
+            _journal.checkpoint()
+        os.remove(path2)
+        _invalidate(path2)
     else:
         print("Cannot delete file. File not found")
-        return
\ No newline at end of file
+        return
+
+# ---------------------------------------------------------------------------
+# asyncio API: the same calls, run on a bounded thread pool
+# (asyncio and concurrent.futures are imported on first use: the shell
+# imports this module at boot and never needs them there)
+# ---------------------------------------------------------------------------
+def setIoWorkers(count):
+    """Resize the thread pool used by the a* functions."""
+    global _io_workers, _io_pool
+    with _io_pool_lock:
+        _io_workers = max(1, count)
+        old, _io_pool = _io_pool, None
+    if old is not None:
+        old.shutdown(wait=True)
+
+def _get_io_pool():
+    global _io_pool
+    with _io_pool_lock:
+        if _io_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _io_pool = ThreadPoolExecutor(max_workers=_io_workers, thread_name_prefix="tbos-io")
+        return _io_pool
+
+async def _run_io(fn, *args):
+    import asyncio
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_io_pool(), functools.partial(fn, *args))
+
+async def acreate(path, extension):
+    return await _run_io(create, path, extension)
+
+async def awrite(file_path, content):
+    return await _run_io(write, file_path, content)
+
+async def awriteAtomic(file_path, content):
+    return await _run_io(writeAtomic, file_path, content)
+
+async def aappend(file_path, content):
+    return await _run_io(append, file_path, content)
+
+async def aread(file_path, amount_of_chars=None):
+    return await _run_io(read, file_path, amount_of_chars)
+
+async def areadLine(file_path, line):
+    return await _run_io(readLine, file_path, line)
+
+async def agetFileExists(path):
+    return await _run_io(getFileExists, path)
+
+async def agetFolderExists(path):
+    return await _run_io(getFolderExists, path)
+
+async def adelete_file(file_path):
+    return await _run_io(delete_file, file_path)
+
+async def areadMany(file_paths, amount_of_chars=None, return_exceptions=False):
+    """Read many files concurrently; results come back in the order of file_paths."""
+    import asyncio
+    return await asyncio.gather(
+        *(aread(p, amount_of_chars) for p in file_paths),
+        return_exceptions=return_exceptions,
+    )
+
+async def awriteMany(files, atomic=False, return_exceptions=False):
+    """Write a {file_path: content} mapping concurrently."""
+    import asyncio
+    writer = awriteAtomic if atomic else awrite
+    return await asyncio.gather(
+        *(writer(p, content) for p, content in files.items()),
+        return_exceptions=return_exceptions,
+    )
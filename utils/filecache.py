@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class FileCache:
+    """
+    Bounded LRU of file contents and stat results, used by utils.data.
+
+    Stat results are trusted for `stat_ttl` seconds, after which the file is
+    stat'ed again. Cached content is only served while the file's mtime and
+    size still match what was read. Local writes go through invalidate(), so
+    they are seen immediately.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=8 * 1024 * 1024, stat_ttl=1.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stat_ttl = stat_ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stats = OrderedDict()     # path -> (checked_at, os.stat_result or None)
+        self._contents = OrderedDict()  # path -> [mtime_ns, size, text, lines or None]
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def stat(self, path):
+        """os.stat(path), or None when it doesn't exist."""
+        now = self.clock()
+        with self._lock:
+            entry = self._stats.get(path)
+            if entry is not None and now - entry[0] < self.stat_ttl:
+                self._stats.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+
+        with self._lock:
+            self._stats[path] = (now, st)
+            self._stats.move_to_end(path)
+            while len(self._stats) > self.max_entries:
+                self._stats.popitem(last=False)
+                self.evictions += 1
+        return st
+
+    def text(self, path):
+        """Whole file as str, from memory when it hasn't changed."""
+        return self._entry(path)[2]
+
+    def lines(self, path):
+        """The file split into lines (without line endings)."""
+        entry = self._entry(path)
+        if entry[3] is None:
+            entry[3] = split_lines(entry[2])
+        return entry[3]
+
+    def _entry(self, path):
+        st = self.stat(path)
+        if st is None:
+            raise FileNotFoundError(path)
+
+        with self._lock:
+            entry = self._contents.get(path)
+            if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                self._contents.move_to_end(path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        with open(path, "r") as f:
+            text = f.read()
+        entry = [st.st_mtime_ns, st.st_size, text, None]
+
+        with self._lock:
+            self._drop(path)
+            if len(text) <= self.max_bytes:
+                self._contents[path] = entry
+                self._bytes += len(text)
+                while len(self._contents) > self.max_entries or self._bytes > self.max_bytes:
+                    _, old = self._contents.popitem(last=False)
+                    self._bytes -= len(old[2])
+                    self.evictions += 1
+        return entry
+
+    def invalidate(self, path):
+        with self._lock:
+            self._stats.pop(path, None)
+            self._drop(path)
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+            self._contents.clear()
+            self._bytes = 0
+
+    def _drop(self, path):
+        old = self._contents.pop(path, None)
+        if old is not None:
+            self._bytes -= len(old[2])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._contents),
+                "bytes": self._bytes,
+            }
+
+
+def split_lines(text):
+    """Split text into lines the same way utils.data.readLine numbers them."""
+    if not text:
+        return []
+    if text.endswith("\n"):
+        text = text[:-1]
+    return [line[:-1] if line.endswith("\r") else line for line in text.split("\n")]
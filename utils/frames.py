@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.1f}ms"
+
+
+class FrameStats:
+    """
+    Histogram of frame times in fixed 0.1 ms buckets (anything from 1 s up
+    shares the last bucket), so recording is O(1) and percentiles need no
+    stored samples. Percentiles report the upper edge of their bucket.
+    """
+
+    BUCKET = 0.0001
+    BUCKETS = 10000
+
+    def __init__(self):
+        self.counts = [0] * (self.BUCKETS + 1)
+        self.frames = 0
+        self.dropped = 0
+        self.total = 0.0
+        self.worst = 0.0
+
+    def record(self, seconds):
+        self.counts[min(self.BUCKETS, int(seconds / self.BUCKET))] += 1
+        self.frames += 1
+        self.total += seconds
+        self.worst = max(self.worst, seconds)
+
+    def percentile(self, p):
+        """Frame time in seconds that p percent of frames did not exceed (0.0 before any frame)."""
+        if not self.frames:
+            return 0.0
+        rank = max(1, -(-self.frames * p // 100))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min((i + 1) * self.BUCKET, self.worst)
+        return self.worst
+
+    def summary(self):
+        if not self.frames:
+            return "frames: none"
+        return (f"frames: {self.frames}  p50 {_ms(self.percentile(50))}  p95 {_ms(self.percentile(95))}"
+                f"  p99 {_ms(self.percentile(99))}  max {_ms(self.worst)}  dropped {self.dropped}")
+
+
+class FrameClock:
+    """
+    Paces a render loop to deadlines on a monotonic clock.
+
+    Call tick() once per frame after drawing. It records how long the frame
+    took, then sleeps until the next deadline, so drawing time comes out of
+    the period instead of adding to it. When a frame overruns, the deadlines
+    that already passed are dropped rather than rushed through, and tick()
+    returns how many were dropped. `load` is a smoothed ratio of frame time
+    to period that loops can use to trade quality for speed.
+
+    The first frame is timed from construction, or from start() when a
+    loop has setup to do before it begins drawing.
+    """
+
+    def __init__(self, period, clock=time.monotonic, sleep=None):
+        self.period = period
+        self.clock = clock
+        self.sleep = sleep or time.sleep
+        self.stats = FrameStats()
+        self.load = 0.0
+        self.start()
+
+    def start(self):
+        """Begin timing the first frame now."""
+        self._frame_start = self._deadline = self.clock()
+
+    def set_period(self, period):
+        """Change the frame period; takes effect from the next deadline."""
+        self.period = period
+
+    def tick(self):
+        now = self.clock()
+        work = now - self._frame_start
+        self.stats.record(work)
+        self.load += (work / self.period - self.load) * 0.2 if self.period > 0 else 0.0
+
+        self._deadline += self.period
+        dropped = 0
+        if now > self._deadline:
+            dropped = int((now - self._deadline) // self.period) + 1 if self.period > 0 else 0
+            self._deadline += dropped * self.period
+            self.stats.dropped += dropped
+        wait = self._deadline - now
+        if wait > 0:
+            self.sleep(wait)
+        self._frame_start = self.clock()
+        return dropped
+
+    def report(self, out=None, environ=os.environ):
+        """Print the frame-time summary when TBOS_FRAME_STATS is set to anything but 0/empty."""
+        if environ.get("TBOS_FRAME_STATS", "") in ("", "0"):
+            return
+        out = out or sys.stdout
+        out.write(self.stats.summary() + "\n")
+        out.flush()
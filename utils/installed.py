@@ -0,0 +1,100 @@
+from utils import data
+
+HEADER = "tbos-apps 1"
+
+
+class InstalledApps:
+    """
+    Set of installed app ids, persisted as a small append-only log:
+
+        tbos-apps 1
+        +1
+        +3
+        -1
+
+    Every change is appended (and fsynced) as it happens, so a crash never
+    loses an install. Once the log holds many more lines than live ids it is
+    compacted with an atomic rewrite. Files in the old `str(list)` format are
+    migrated on load.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._ids = set()
+        self._log_lines = 0
+
+    def __contains__(self, app_id):
+        return app_id in self._ids
+
+    def __iter__(self):
+        return iter(sorted(self._ids))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def load(self):
+        self._ids = set()
+        self._log_lines = 0
+        if not data.getFileExists(self.file_path):
+            self._rewrite()
+            return self
+
+        content = data.read(self.file_path, None)
+        lines = content.splitlines()
+        if not lines or lines[0] != HEADER:
+            # legacy format: repr of a list of single-digit id strings
+            self._ids = {int(ch) for ch in content if ch.isdigit()}
+            self._rewrite()
+            return self
+
+        for line in lines[1:]:
+            if len(line) < 2 or line[0] not in "+-":
+                continue  # torn trailing write or junk
+            try:
+                app_id = int(line[1:])
+            except ValueError:
+                continue
+            if line[0] == "+":
+                self._ids.add(app_id)
+            else:
+                self._ids.discard(app_id)
+            self._log_lines += 1
+
+        # a torn tail would glue the next append onto it, so drop it now
+        if not content.endswith("\n") or self._log_lines > 2 * len(self._ids) + 16:
+            self._rewrite()
+        return self
+
+    def add(self, app_id):
+        """Install app_id. Returns False if it was already installed."""
+        if app_id in self._ids:
+            return False
+        self._ids.add(app_id)
+        self._append(f"+{app_id}\n")
+        return True
+
+    def add_many(self, app_ids):
+        new = [app_id for app_id in app_ids if app_id not in self._ids]
+        if new:
+            self._ids.update(new)
+            self._append("".join(f"+{app_id}\n" for app_id in new))
+        return new
+
+    def remove(self, app_id):
+        if app_id not in self._ids:
+            return False
+        self._ids.discard(app_id)
+        self._append(f"-{app_id}\n")
+        return True
+
+    def compact(self):
+        self._rewrite()
+
+    def _append(self, text):
+        data.append(self.file_path, text)
+        self._log_lines += text.count("\n")
+
+    def _rewrite(self):
+        body = "".join(f"+{app_id}\n" for app_id in sorted(self._ids))
+        data.writeAtomic(self.file_path, HEADER + "\n" + body)
+        self._log_lines = len(self._ids)
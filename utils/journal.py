@@ -0,0 +1,165 @@
+import os
+import struct
+import threading
+import zlib
+
+_RECORD = struct.Struct("<4sIII")  # magic, path length, content length, crc32 of path + content
+_MAGIC = b"TBJ1"
+
+
+class WriteJournal:
+    """
+    Write-behind journal used by utils.data.write.
+
+    write() only records the new content in memory. A background flusher
+    group-commits everything buffered to a single append-only journal file
+    (one sequential write plus fsync) once `max_pending_bytes` are waiting
+    or `max_delay` seconds have passed. When the journal grows past
+    `checkpoint_bytes` the latest content of every file is written to its
+    real location with `apply(path, content)` and the journal is truncated.
+    replay() does the same for a journal left behind by a crash.
+
+    Until a checkpoint, get(path) returns the newest content so readers
+    never see a stale file.
+    """
+
+    def __init__(self, journal_path, apply, max_pending_bytes=64 * 1024, max_delay=0.5,
+                 checkpoint_bytes=1024 * 1024):
+        self.journal_path = journal_path
+        self.apply = apply
+        self.max_pending_bytes = max_pending_bytes
+        self.max_delay = max_delay
+        self.checkpoint_bytes = checkpoint_bytes
+        self.commits = 0
+        self.checkpoints = 0
+
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._commit_lock = threading.Lock()
+        self._pending = {}   # path -> newest content, until it is checkpointed
+        self._buffer = []    # encoded records not yet in the journal file
+        self._buffered_bytes = 0
+        self._journal_bytes = 0
+        self._closed = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="tbos-journal", daemon=True)
+        self._thread.start()
+        return self
+
+    def write(self, path, content):
+        record = _encode(path, content)
+        with self._lock:
+            if self._closed:
+                raise ValueError("write to a closed journal")
+            self._pending[path] = content
+            self._buffer.append(record)
+            self._buffered_bytes += len(record)
+            if self._buffered_bytes >= self.max_pending_bytes:
+                self._wake.notify()
+
+    def get(self, path):
+        """Newest content written to path that hasn't been checkpointed yet, or None."""
+        with self._lock:
+            return self._pending.get(path)
+
+    def commit(self):
+        """Append everything buffered to the journal file and fsync it."""
+        with self._commit_lock:
+            self._commit_locked()
+
+    def checkpoint(self):
+        """Commit, write the latest content of every journaled file in place, then truncate the journal."""
+        with self._commit_lock:
+            self._commit_locked()
+            with self._lock:
+                snapshot = list(self._pending.items())
+            for path, content in snapshot:
+                self.apply(path, content)
+            with open(self.journal_path, "wb") as f:
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_bytes = 0
+            self.checkpoints += 1
+            with self._lock:
+                for path, content in snapshot:
+                    # keep anything rewritten while we were applying
+                    if self._pending.get(path) is content:
+                        del self._pending[path]
+
+    def replay(self):
+        """Apply a journal left by an earlier run. Returns how many files were restored."""
+        try:
+            with open(self.journal_path, "rb") as f:
+                blob = f.read()
+        except FileNotFoundError:
+            return 0
+
+        latest = {}
+        for path, content in _decode_all(blob):
+            latest[path] = content
+        for path, content in latest.items():
+            self.apply(path, content)
+        with open(self.journal_path, "wb") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_bytes = 0
+        return len(latest)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.checkpoint()
+
+    def _commit_locked(self):
+        with self._lock:
+            records, self._buffer = self._buffer, []
+            self._buffered_bytes = 0
+        if not records:
+            return
+        blob = b"".join(records)
+        with open(self.journal_path, "ab") as f:
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_bytes += len(blob)
+        self.commits += 1
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._closed and self._buffered_bytes < self.max_pending_bytes:
+                    self._wake.wait(self.max_delay)
+                if self._closed:
+                    return
+            self.commit()
+            if self._journal_bytes >= self.checkpoint_bytes:
+                self.checkpoint()
+
+
+def _encode(path, content):
+    p = path.encode("utf-8")
+    c = content.encode("utf-8")
+    return _RECORD.pack(_MAGIC, len(p), len(c), zlib.crc32(c, zlib.crc32(p))) + p + c
+
+
+def _decode_all(blob):
+    """Yield (path, content) for every intact record; stop at the first torn or corrupt one."""
+    i = 0
+    while i + _RECORD.size <= len(blob):
+        magic, plen, clen, crc = _RECORD.unpack_from(blob, i)
+        start = i + _RECORD.size
+        end = start + plen + clen
+        if magic != _MAGIC or end > len(blob):
+            return
+        p = blob[start:start + plen]
+        c = blob[start + plen:end]
+        if zlib.crc32(c, zlib.crc32(p)) != crc:
+            return
+        yield p.decode("utf-8"), c.decode("utf-8")
+        i = end
@@ -0,0 +1,234 @@
+import os
+import queue
+import sys
+import threading
+import time
+from collections import namedtuple
+
+KeyEvent = namedtuple("KeyEvent", "key time")
+
+# final bytes of CSI (ESC [) and SS3 (ESC O) sequences for the arrow keys
+_ARROWS = {"A": "up", "B": "down", "C": "right", "D": "left"}
+# second byte after the 0x00 / 0xE0 prefix msvcrt.getch() returns for arrows
+_SCAN_CODES = {b"H": "up", b"P": "down", b"M": "right", b"K": "left"}
+_CONTROL = {"\r": "enter", "\n": "enter", "\t": "tab", "\x7f": "backspace", "\x08": "backspace"}
+
+
+def _utf8_length(lead):
+    if lead < 0x80:
+        return 1
+    if lead >= 0xF0:
+        return 4
+    if lead >= 0xE0:
+        return 3
+    return 2
+
+
+class KeyDecoder:
+    """
+    Turns raw terminal bytes into key names: a printable character as
+    itself, "up"/"down"/"left"/"right" for arrows, "esc", "enter", "tab"
+    and "backspace". A sequence split across reads is held until the rest
+    arrives; flush() gives up on it (a lone ESC becomes "esc").
+    Unknown escape sequences are dropped whole.
+    """
+
+    def __init__(self, scan_codes=False):
+        self.scan_codes = scan_codes  # Windows console: 0x00/0xE0 prefix an arrow's scan code
+        self._pending = b""
+
+    def feed(self, data):
+        buf = self._pending + data
+        keys = []
+        i = 0
+        n = len(buf)
+        while i < n:
+            b = buf[i]
+            if b == 0x1B:
+                if i + 1 == n:
+                    break
+                if buf[i + 1] in b"[O":
+                    j = i + 2
+                    while j < n and not 0x40 <= buf[j] <= 0x7E:
+                        j += 1
+                    if j == n:
+                        break  # sequence continues in the next read
+                    if j == i + 2 and chr(buf[j]) in _ARROWS:
+                        keys.append(_ARROWS[chr(buf[j])])
+                    i = j + 1
+                    continue
+                keys.append("esc")
+                i += 1
+                continue
+            if self.scan_codes and b in (0x00, 0xE0):
+                if i + 1 == n:
+                    break
+                key = _SCAN_CODES.get(buf[i + 1:i + 2])
+                if key:
+                    keys.append(key)
+                i += 2
+                continue
+            size = _utf8_length(b)
+            if i + size > n:
+                break
+            ch = buf[i:i + size].decode("utf-8", "replace")
+            keys.append(_CONTROL.get(ch, ch))
+            i += size
+        self._pending = buf[i:]
+        return keys
+
+    def flush(self):
+        pending, self._pending = self._pending, b""
+        return ["esc"] if pending == b"\x1b" else []
+
+
+class _TerminalSource:
+    """stdin on POSIX, switched to cbreak mode (keys arrive without Enter, no echo)."""
+
+    scan_codes = False
+
+    def __init__(self, fd):
+        self.fd = fd
+        self._saved = None
+
+    def open(self):
+        if os.isatty(self.fd):
+            import termios
+            import tty
+            self._saved = termios.tcgetattr(self.fd)
+            tty.setcbreak(self.fd)
+
+    def close(self):
+        if self._saved is not None:
+            import termios
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self._saved)
+            self._saved = None
+
+    def read(self, timeout):
+        import select
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return b""
+        data = os.read(self.fd, 1024)
+        if not data:
+            raise EOFError
+        return data
+
+
+class _ConsoleSource:
+    """The Windows console through msvcrt, which has no blocking wait, so it polls."""
+
+    scan_codes = True
+    POLL = 0.005
+
+    def __init__(self, msvcrt):
+        self.msvcrt = msvcrt
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def read(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.msvcrt.kbhit():
+            if time.monotonic() >= deadline:
+                return b""
+            time.sleep(self.POLL)
+        data = bytearray()
+        while self.msvcrt.kbhit():
+            data += self.msvcrt.getch()
+        return bytes(data)
+
+
+def _platform_source():
+    """The keyboard of this process, or None when stdin is not something we can read keys from."""
+    if os.name == "nt":
+        import msvcrt
+        return _ConsoleSource(msvcrt)
+    try:
+        return _TerminalSource(sys.stdin.fileno())
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class Keyboard:
+    """
+    Reads the keyboard on a background thread and queues every key as a
+    KeyEvent(key, time) stamped with time.monotonic() when it was decoded.
+
+    Loops call events() once per tick to take everything typed since the
+    previous tick, in order, so fast typing loses nothing and a key waits
+    at most one tick. The reader blocks in select() (POSIX) or polls
+    msvcrt (Windows) and wakes every `wait` seconds to notice stop() and
+    to resolve a lone ESC.
+
+        with Keyboard() as keyboard:
+            while running:
+                for event in keyboard.events():
+                    ...
+    """
+
+    def __init__(self, source=None, clock=time.monotonic, wait=0.05):
+        self.source = _platform_source() if source is None else source
+        self.clock = clock
+        self.wait = wait
+        self.decoder = KeyDecoder(scan_codes=getattr(self.source, "scan_codes", False))
+        self._events = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.source is None or self._thread is not None:
+            return self
+        self.source.open()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="keyboard", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        self._thread = None
+        self.source.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def feed(self, data):
+        """Decode bytes as if they were typed."""
+        now = self.clock()
+        for key in self.decoder.feed(data):
+            self._events.put(KeyEvent(key, now))
+
+    def events(self):
+        """Every key typed since the last call, oldest first."""
+        out = []
+        while True:
+            try:
+                out.append(self._events.get_nowait())
+            except queue.Empty:
+                return out
+
+    def pending(self):
+        return not self._events.empty()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                data = self.source.read(self.wait)
+            except (EOFError, OSError):
+                break
+            if data:
+                self.feed(data)
+            else:
+                now = self.clock()
+                for key in self.decoder.flush():
+                    self._events.put(KeyEvent(key, now))
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Small in-memory LRU keyed by any hashable. Values are bytes-like (or
+    anything with a len()); the cache keeps at most `max_entries` of them
+    and at most `max_bytes` in total.
+    """
+
+    def __init__(self, max_entries=16, max_bytes=8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, size=None):
+        size = len(value) if size is None else size
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[0]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (old_size, _value) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._bytes}
+
+
+class DiskCache:
+    """
+    Text blobs stored as one file each under `directory`, named by a hash of
+    the key. The total size is kept under `max_bytes` by deleting the least
+    recently used files; a hit refreshes the file's mtime, so mtime order is
+    use order. Writes go to a temp file and are renamed into place, so a
+    reader never sees a partial entry.
+    """
+
+    def __init__(self, directory, max_bytes=8 * 1024 * 1024, suffix=".ansi"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._sizes = None  # file name -> size, scanned on first use
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _name(self, key):
+        return hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + self.suffix
+
+    def get(self, key):
+        path = os.path.join(self.directory, self._name(key))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return text
+
+    def put(self, key, text):
+        blob = text.encode("utf-8")
+        if len(blob) > self.max_bytes:
+            return
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            self._scan()
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, path)
+            self._bytes += len(blob) - self._sizes.get(name, 0)
+            self._sizes[name] = len(blob)
+            if self._bytes > self.max_bytes:
+                self._evict(keep=name)
+
+    def clear(self):
+        with self._lock:
+            self._scan()
+            for name in list(self._sizes):
+                self._remove(name)
+
+    def size(self):
+        with self._lock:
+            self._scan()
+            return self._bytes
+
+    def _scan(self):
+        if self._sizes is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._sizes = {}
+        self._bytes = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.suffix):
+                self._sizes[entry.name] = entry.stat().st_size
+                self._bytes += self._sizes[entry.name]
+
+    def _evict(self, keep):
+        by_age = []
+        for name in self._sizes:
+            try:
+                by_age.append((os.stat(os.path.join(self.directory, name)).st_mtime_ns, name))
+            except OSError:
+                by_age.append((0, name))
+        for _mtime, name in sorted(by_age):
+            if self._bytes <= self.max_bytes:
+                break
+            if name != keep:
+                self._remove(name)
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+        self._bytes -= self._sizes.pop(name, 0)
@@ -0,0 +1,139 @@
+import os
+import sys
+
+HOME = "\x1b[H"
+CLEAR = "\x1b[2J"
+RESET = "\x1b[0m"
+HIDE_CURSOR = "\x1b[?25l"
+SHOW_CURSOR = "\x1b[?25h"
+
+_vt_checked = False
+
+
+def move(x, y):
+    """Escape that puts the cursor at column x, row y (0-based)."""
+    return f"\x1b[{y + 1};{x + 1}H"
+
+
+def enable_vt_mode():
+    """Enable ANSI escape processing on Windows terminals that need it. Only the first call does anything."""
+    global _vt_checked
+    if _vt_checked:
+        return
+    _vt_checked = True
+    if os.name != "nt":
+        return
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        h = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint()
+        if kernel32.GetConsoleMode(h, ctypes.byref(mode)):
+            kernel32.SetConsoleMode(h, mode.value | 0x0004)  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+    except Exception:
+        pass
+
+
+def clear_screen(out=None):
+    """Clear the terminal and home the cursor with escapes (no `cls` subprocess)."""
+    enable_vt_mode()
+    out = out or sys.stdout
+    out.write(CLEAR + HOME)
+    out.flush()
+
+
+class FrameBuffer:
+    """
+    Double-buffered grid of character cells.
+
+    Apps draw a frame into the back buffer (clear, put) and call present(),
+    which compares it with the frame on screen (the front buffer) and writes
+    only the cells that changed, using cursor addressing, in one write. The
+    first frame after creation, resize() or invalidate() clears the screen
+    and draws everything.
+
+    Each cell holds one character and a style: an escape prefix such as
+    "\\x1b[32m", or "" for the default look.
+    """
+
+    def __init__(self, cols, rows, out=None):
+        self.out = out
+        self.resize(cols, rows)
+
+    def resize(self, cols, rows):
+        self.cols = cols
+        self.rows = rows
+        self.chars = [[" "] * cols for _ in range(rows)]
+        self.styles = [[""] * cols for _ in range(rows)]
+        self._front = None
+
+    def invalidate(self):
+        """Redraw every cell on the next present()."""
+        self._front = None
+
+    def clear(self):
+        cols = self.cols
+        for y in range(self.rows):
+            self.chars[y] = [" "] * cols
+            self.styles[y] = [""] * cols
+
+    def put(self, x, y, text, style=""):
+        """Write text starting at (x, y); whatever falls outside the grid is dropped."""
+        if not 0 <= y < self.rows:
+            return
+        start = max(0, x)
+        end = min(self.cols, x + len(text))
+        if start >= end:
+            return
+        self.chars[y][start:end] = text[start - x:end - x]
+        self.styles[y][start:end] = [style] * (end - start)
+
+    def put_lines(self, lines, x=0, y=0, style=""):
+        for i, line in enumerate(lines):
+            self.put(x, y + i, line, style)
+
+    def render(self):
+        """The escapes that turn the front frame into the back frame; the back frame becomes the front."""
+        parts = []
+        front = self._front
+        if front is None:
+            parts.append(CLEAR)
+        front_chars, front_styles = front if front is not None else (None, None)
+        style = ""
+        cursor = None
+        for y in range(self.rows):
+            row_chars, row_styles = self.chars[y], self.styles[y]
+            if front is not None and row_chars == front_chars[y] and row_styles == front_styles[y]:
+                continue
+            old_chars = front_chars[y] if front is not None else None
+            old_styles = front_styles[y] if front is not None else None
+            for x in range(self.cols):
+                ch, st = row_chars[x], row_styles[x]
+                if old_chars is not None and ch == old_chars[x] and st == old_styles[x]:
+                    continue
+                if cursor != (x, y):
+                    parts.append(move(x, y))
+                if st != style:
+                    parts.append(RESET + st)
+                    style = st
+                parts.append(ch)
+                cursor = (x + 1, y)
+        if style:
+            parts.append(RESET)
+        self._front = ([row[:] for row in self.chars], [row[:] for row in self.styles])
+        return "".join(parts)
+
+    def present(self):
+        """Write the changes since the last frame in one write."""
+        text = self.render()
+        if text:
+            enable_vt_mode()
+            out = self.out or sys.stdout
+            out.write(text)
+            out.flush()
+
+    def finish(self):
+        """Leave the cursor on the line below the frame, ready for normal output."""
+        out = self.out or sys.stdout
+        out.write(RESET + move(0, self.rows) + SHOW_CURSOR)
+        out.flush()
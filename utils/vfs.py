@@ -0,0 +1,291 @@
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+# File layout:
+#   header  | record | record | ... | index | record | ...
+#
+# header: magic, offset and length of the newest index block
+# record: a file's content (or a tombstone), appended on every write
+# index:  name -> (data offset, length, crc32) for every live file,
+#         written on sync(); records after it are recovered by scanning.
+_HEADER = struct.Struct("<8sQQ")
+_MAGIC = b"TBVFS001"
+_RECORD = struct.Struct("<4sHIII")  # magic, name length, data length, crc32, flags
+_RECORD_MAGIC = b"TBVR"
+_INDEX = struct.Struct("<4sI")  # magic, entry count
+_INDEX_MAGIC = b"TBVI"
+_ENTRY = struct.Struct("<HQII")  # name length, data offset, data length, crc32
+_DELETED = 1
+
+
+def _record_size(name, length):
+    """Bytes a record takes in the container: header, encoded name and data."""
+    return _RECORD.size + len(name.encode("utf-8")) + length
+
+
+class PackFile:
+    """
+    Many small files packed into one container.
+
+    Lookups go through an in-memory index (name -> offset, length, crc32),
+    reads are zero-copy slices of an mmap of the container, and writes are
+    appended so a write is one sequential I/O. Overwritten and deleted
+    records stay behind as garbage until compact() rewrites the container;
+    that happens automatically once garbage outweighs live data.
+    """
+
+    def __init__(self, path, fsync=True, compact_min_bytes=1024 * 1024):
+        self.path = path
+        self.fsync = fsync
+        self.compact_min_bytes = compact_min_bytes
+        self._index = {}  # name -> (offset, length, crc)
+        self._live_bytes = 0  # live records, headers and names included
+        self._dead_bytes = 0  # superseded records, tombstones and stale index blocks
+        self._index_length = 0  # size of the index block the header points at
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._open()
+
+    # -- reading -------------------------------------------------------------
+    def __contains__(self, name):
+        return name in self._index
+
+    def names(self, prefix=""):
+        return sorted(n for n in self._index if n.startswith(prefix))
+
+    def read_bytes(self, name, verify=False):
+        """Content of `name` as a memoryview into the mapped container."""
+        with self._lock:
+            try:
+                offset, length, crc = self._index[name]
+            except KeyError:
+                raise FileNotFoundError(f"{name} (in {self.path})") from None
+            if self._mm is None or offset + length > len(self._mm):
+                self._remap()
+            view = memoryview(self._mm)[offset:offset + length]
+        if verify and zlib.crc32(view) != crc:
+            raise ValueError(f"checksum mismatch for {name!r} in {self.path}")
+        return view
+
+    def read(self, name):
+        return str(self.read_bytes(name), "utf-8")
+
+    # -- writing -------------------------------------------------------------
+    def write(self, name, content):
+        blob = content.encode("utf-8") if isinstance(content, str) else bytes(content)
+        with self._lock:
+            offset = self._append_record(name, blob, 0)
+            self._forget(name)
+            self._index[name] = (offset, len(blob), zlib.crc32(blob))
+            self._live_bytes += _record_size(name, len(blob))
+            self._maybe_compact()
+
+    def delete(self, name):
+        with self._lock:
+            if name not in self._index:
+                raise FileNotFoundError(name)
+            self._append_record(name, b"", _DELETED)
+            self._forget(name)
+            self._dead_bytes += _record_size(name, 0)
+            self._maybe_compact()
+
+    def sync(self):
+        """Write the index block and point the header at it."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._f.seek(0, os.SEEK_END)
+            index_offset = self._f.tell()
+            block = self._encode_index()
+            self._f.write(block)
+            # the index must be on disk before a durable header can point at it
+            self._flush()
+            self._f.seek(0)
+            self._f.write(_HEADER.pack(_MAGIC, index_offset, len(block)))
+            self._flush()
+            self._dead_bytes += self._index_length
+            self._index_length = len(block)
+            self._dirty = False
+
+    def compact(self):
+        """Rewrite the container with only live files, then swap it in atomically."""
+        with self._lock:
+            tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as out:
+                out.write(_HEADER.pack(_MAGIC, 0, 0))
+                new_index = {}
+                for name in sorted(self._index):
+                    data = bytes(self.read_bytes(name))
+                    n = name.encode("utf-8")
+                    crc = zlib.crc32(data)
+                    out.write(_RECORD.pack(_RECORD_MAGIC, len(n), len(data), crc, 0) + n)
+                    new_index[name] = (out.tell(), len(data), crc)
+                    out.write(data)
+                index_offset = out.tell()
+                self._index = new_index
+                block = self._encode_index()
+                out.write(block)
+                out.seek(0)
+                out.write(_HEADER.pack(_MAGIC, index_offset, len(block)))
+                out.flush()
+                os.fsync(out.fileno())
+            self._close_handles()
+            os.replace(tmp, self.path)
+            self._open()
+
+    def close(self):
+        with self._lock:
+            self.sync()
+            self._close_handles()
+
+    # -- internals -----------------------------------------------------------
+    def _open(self):
+        if not os.path.exists(self.path):
+            with open(self.path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, 0, 0))
+        self._f = open(self.path, "r+b")
+        self._mm = None
+        self._remap()
+        self._load()
+
+    def _close_handles(self):
+        # views handed out by read_bytes keep the old map alive until they are dropped
+        self._mm = None
+        self._f.close()
+
+    def _remap(self):
+        self._f.flush()
+        size = os.fstat(self._f.fileno()).st_size
+        self._mm = mmap.mmap(self._f.fileno(), size, access=mmap.ACCESS_READ) if size else None
+
+    def _load(self):
+        mm = self._mm
+        magic, index_offset, index_length = _HEADER.unpack_from(mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{self.path} is not a tbos pack file")
+
+        self._live_bytes = self._dead_bytes = self._index_length = 0
+        self._index = self._read_index(index_offset, index_length) if index_offset else {}
+        if self._index is None:
+            # the header outlived its index (crash mid-sync): rebuild from the records
+            self._index = {}
+            self._dirty = True
+            self._recover(_HEADER.size)
+            return
+        self._live_bytes = sum(_record_size(name, entry[1]) for name, entry in self._index.items())
+        pos = _HEADER.size
+        if index_offset:
+            # everything before the index that isn't a live record is garbage
+            self._dead_bytes = index_offset - _HEADER.size - self._live_bytes
+            self._index_length = index_length
+            pos = index_offset + index_length
+        self._recover(pos)
+
+    def _read_index(self, index_offset, index_length):
+        """The index block the header points at, or None when it is missing or damaged."""
+        mm = self._mm
+        end = index_offset + index_length
+        if mm is None or end > len(mm) or mm[index_offset:index_offset + 4] != _INDEX_MAGIC:
+            return None
+        index = {}
+        try:
+            count = _INDEX.unpack_from(mm, index_offset)[1]
+            p = index_offset + _INDEX.size
+            for _ in range(count):
+                nlen, offset, length, crc = _ENTRY.unpack_from(mm, p)
+                p += _ENTRY.size
+                index[str(mm[p:p + nlen], "utf-8")] = (offset, length, crc)
+                p += nlen
+        except (struct.error, UnicodeDecodeError):
+            return None
+        if p != end or any(offset + length > index_offset for offset, length, _ in index.values()):
+            return None
+        return index
+
+    def _recover(self, pos):
+        """Replay records appended after the newest index; stop at a torn one."""
+        mm = self._mm
+        size = len(mm)
+        while pos + 4 <= size:
+            magic = mm[pos:pos + 4]
+            if magic == _INDEX_MAGIC:
+                try:
+                    count = _INDEX.unpack_from(mm, pos)[1]
+                    p = pos + _INDEX.size
+                    for _ in range(count):
+                        p += _ENTRY.size + _ENTRY.unpack_from(mm, p)[0]
+                except struct.error:
+                    break
+                if p > size:
+                    break
+                self._dead_bytes += p - pos  # an index block no header points at
+                pos = p
+                continue
+            if magic != _RECORD_MAGIC or pos + _RECORD.size > size:
+                break
+            _, nlen, length, crc, flags = _RECORD.unpack_from(mm, pos)
+            data_offset = pos + _RECORD.size + nlen
+            if data_offset + length > size or zlib.crc32(mm[data_offset:data_offset + length]) != crc:
+                break
+            name = str(mm[pos + _RECORD.size:data_offset], "utf-8")
+            self._forget(name)
+            if flags & _DELETED:
+                self._dead_bytes += _record_size(name, length)
+            else:
+                self._index[name] = (data_offset, length, crc)
+                self._live_bytes += _record_size(name, length)
+            self._dirty = True
+            pos = data_offset + length
+        if pos < size:
+            # drop a torn tail so new records start on a clean boundary
+            self._mm = None
+            self._f.truncate(pos)
+            self._remap()
+
+    def _append_record(self, name, blob, flags):
+        n = name.encode("utf-8")
+        self._f.seek(0, os.SEEK_END)
+        offset = self._f.tell() + _RECORD.size + len(n)
+        self._f.write(_RECORD.pack(_RECORD_MAGIC, len(n), len(blob), zlib.crc32(blob), flags) + n + blob)
+        self._flush()
+        self._dirty = True
+        return offset
+
+    def _forget(self, name):
+        old = self._index.pop(name, None)
+        if old is not None:
+            size = _record_size(name, old[1])
+            self._live_bytes -= size
+            self._dead_bytes += size
+
+    def _maybe_compact(self):
+        if self._dead_bytes > self.compact_min_bytes and self._dead_bytes > self._live_bytes:
+            self.compact()
+
+    def _encode_index(self):
+        parts = [_INDEX.pack(_INDEX_MAGIC, len(self._index))]
+        for name, (offset, length, crc) in self._index.items():
+            n = name.encode("utf-8")
+            parts.append(_ENTRY.pack(len(n), offset, length, crc) + n)
+        return b"".join(parts)
+
+    def _flush(self):
+        self._f.flush()
+        if self.fsync:
+            os.fsync(self._f.fileno())
+
+
+def pack_dir(directory, pack_path):
+    """Copy every file under `directory` into a new pack at `pack_path` (names are relative, '/'-separated)."""
+    pack = PackFile(pack_path, fsync=False)
+    for root, _dirs, files in os.walk(directory):
+        for file_name in files:
+            full = os.path.join(root, file_name)
+            with open(full, "rb") as f:
+                pack.write(os.path.relpath(full, directory).replace(os.sep, "/"), f.read())
+    pack.fsync = True
+    pack.close()
+    return pack_path